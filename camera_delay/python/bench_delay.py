@@ -0,0 +1,524 @@
+import numpy as np
+import cv2
+import time
+import os
+import argparse
+import asyncio
+import threading
+import functools
+import random
+
+import delay_cli
+from delay_async import AsyncDelayEngine
+from delay_cli import advance_display
+from delay_config import parse_display, parse_affinity, BUFFER_BACKENDS
+from frame_array import FrameArray, DisplayTable, update_display_table, cleanup_table
+from realtime import ThreadPolicy, policy_target
+from delay_data import DelaySampler, NUM_DATA_POINTS, delay_stats, format_value, to_ns
+from capture_clock import CaptureClock, TIMESTAMP_SOURCES, CLOCK_WINDOW
+from delay_control import DelayController, CONTROL_GAIN
+from telemetry import Telemetry
+from frame_drops import DropMonitor
+from frame_retention import MotionRetention, RETENTION_THRESHOLD
+from delta_buffer import DeltaEncoder, FrameDecoder
+from capture_crop import get_capture_crop
+
+# Delay engine benchmark
+# Runs the engines headless against a synthetic camera (or a recorded video) and samples every display's delay
+# (the delay its current frame was presented with) with DelaySampler, the random-interval method
+# of collect_data in the C++ DelayCLI, so the results are comparable with cpp/Delay_Cli/data.
+
+class SyntheticCapture:
+    """
+    Stands in for cv2.VideoCapture, delivering generated frames at a fixed frame rate.
+    Each frame is delivered latency plus up to jitter seconds after it was captured, like the
+    varying driver and decode latency of a camera, and with driver_timestamps CAP_PROP_POS_MSEC
+    reports the capture time of the last frame read. Each frame is dropped with probability
+    drop_rate, like a camera short of USB bandwidth; dropped counts them. With motion the frames
+    are a still scene in which a square covering that fraction of the frame moves, otherwise
+    every frame is a new flat colour.
+    """
+    def __init__(self, fps=30.0, width=640, height=480, latency=0.0, jitter=0.0, driver_timestamps=False, drop_rate=0.0,
+                 motion=None):
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.frame_period = 1.0 / fps
+        self.latency = latency
+        self.jitter = jitter
+        self.driver_timestamps = driver_timestamps
+        self.drop_rate = drop_rate
+        self.dropped = 0
+        self.motion = motion
+        if motion is not None:
+            # a gradient, so the moving square is visible wherever it is
+            self.scene = np.empty((height, width, 3), np.uint8)
+            self.scene[:] = np.linspace(0, 255, width, dtype=np.uint8)[None, :, None]
+            self.square = max(1, round(np.sqrt(motion * width * height))) if motion > 0 else 0
+        self.next_time = time.perf_counter()
+        self.capture_time = None
+        self.count = 0
+
+    def read(self):
+        self.next_time += self.frame_period
+        while random.random() < self.drop_rate:
+            self.next_time += self.frame_period
+            self.dropped += 1
+        self.capture_time = self.next_time
+        sleep_time = self.next_time + self.latency + random.uniform(0, self.jitter) - time.perf_counter()
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+        self.count += 1
+        return True, self.next_frame()
+
+    def next_frame(self):
+        if self.motion is None:
+            return np.full((self.height, self.width, 3), self.count % 256, np.uint8)
+        frame = self.scene.copy()
+        if self.square:
+            # sweeps across the frame, 4 pixels per frame
+            x = (self.count * 4) % max(1, self.width - self.square)
+            y = (self.height - self.square) // 2
+            frame[y:y + self.square, x:x + self.square] = 255 - frame[y:y + self.square, x:x + self.square]
+        return frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        if prop == cv2.CAP_PROP_POS_MSEC and self.driver_timestamps and self.capture_time is not None:
+            return self.capture_time * 1000
+        return 0
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+class RecordedCapture(SyntheticCapture):
+    """
+    Plays a video file in a loop, paced to its own frame rate (or fps), so every engine
+    sees the same recorded input.
+    """
+    def __init__(self, path, fps=None):
+        self.video = cv2.VideoCapture(path)
+        if not self.video.isOpened():
+            raise ValueError(f"unable to open video {path}")
+        super().__init__(fps or self.video.get(cv2.CAP_PROP_FPS) or 30.0,
+                         int(self.video.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.video.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    def next_frame(self):
+        ret, frame = self.video.read()
+        if not ret:
+            # end of the recording, start again from the first frame
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.video.read()
+        return frame
+
+    def release(self):
+        self.video.release()
+
+def make_displays(display_configs):
+    displays = [delay_cli.CaptureDisplay(display.delay, display.frame_rate, display.roi, display.size) for display in display_configs]
+    displays.sort(key=delay_cli.key_function)
+    return displays
+
+def run_threaded(capture, displays, duration, capture_interval, policy=None, buffer='linked_list', timestamps='auto',
+                 control_gain=None, telemetry=None, motion_threshold=None):
+    """
+    Run the delay_cli.py engine threads for duration seconds.
+    """
+    frame_buffer = FrameArray() if buffer == 'array' else delay_cli.DoublyLinkedList()
+    crop = get_capture_crop(displays, (capture.width, capture.height))
+    ret, frame = capture.read()
+    frame = delay_cli.prepare_frame(frame, 'BGR', None, None, crop)
+    if telemetry is not None:
+        telemetry.set('Stored frame bytes', frame.raw.nbytes)
+    frame_ref = [frame]
+    frame_buffer.add_to_tail(frame, time.perf_counter_ns())
+
+    run = threading.Event()
+    read = threading.Event()
+    lock = threading.Lock()
+    run.set()
+    if buffer == 'array':
+        table = DisplayTable(displays)
+        update_thread = threading.Thread(target=policy_target(policy, 'update', update_display_table), args=(frame_buffer, table, run))
+        cleanup_thread = threading.Thread(target=policy_target(policy, 'cleanup', cleanup_table), args=(frame_buffer, table, run))
+        presented_delays = functools.partial(table.presented_delays, frame_buffer)
+    else:
+        for display in displays:
+            display.frame_node = frame_buffer.head_node
+        update_thread = threading.Thread(target=policy_target(policy, 'update', delay_cli.update_displays), args=(frame_buffer, displays, run))
+        cleanup_thread = threading.Thread(target=policy_target(policy, 'cleanup', delay_cli.cleanup), args=(frame_buffer, displays, run))
+        presented_delays = functools.partial(delay_cli.display_delays, displays)
+    threads = [
+        threading.Thread(target=policy_target(policy, 'capture', delay_cli.capture_frames), args=(capture, frame_buffer, capture_interval, read, run, lock, frame_ref)),
+        update_thread,
+        threading.Thread(target=policy_target(policy, 'retrieve', delay_cli.retrieve_frames),
+                         args=(capture, run, read, lock, frame_ref, 'BGR', None, None, None, CaptureClock.for_capture(capture, timestamps),
+                               DropMonitor.for_capture('camera', capture, telemetry),
+                               MotionRetention(motion_threshold, telemetry=telemetry) if motion_threshold is not None else None,
+                               DeltaEncoder(telemetry=telemetry) if buffer == 'delta' else None, crop)),
+        cleanup_thread,
+    ]
+    if control_gain is not None:
+        controller = DelayController(displays, presented_delays, table if buffer == 'array' else None, telemetry, control_gain)
+        threads.append(threading.Thread(target=policy_target(policy, 'control', controller.run), args=(run,)))
+    for thread in threads:
+        thread.start()
+    yield run, presented_delays
+    time.sleep(duration)
+    run.clear()
+    for thread in threads:
+        thread.join()
+
+def run_asyncio(capture, displays, duration, capture_interval, policy=None, buffer='linked_list', timestamps='auto',
+                control_gain=None, telemetry=None, motion_threshold=None):
+    """
+    Run the delay_async.py engine for duration seconds.
+    """
+    crop = get_capture_crop(displays, (capture.width, capture.height))
+    engine = AsyncDelayEngine(capture, displays, capture_interval=capture_interval, headless=True, record=False, policy=policy,
+                              buffer=buffer, timestamps=timestamps, control_gain=control_gain, telemetry=telemetry,
+                              motion_threshold=motion_threshold, crop=crop)
+    ret, frame = capture.read()
+    frame = delay_cli.prepare_frame(frame, 'BGR', None, None, crop)
+    if telemetry is not None:
+        telemetry.set('Stored frame bytes', frame.raw.nbytes)
+    engine.start(frame)
+    if engine.table is not None:
+        presented_delays = functools.partial(engine.table.presented_delays, engine.frame_buffer)
+    else:
+        presented_delays = functools.partial(delay_cli.display_delays, displays)
+    loop_thread = threading.Thread(target=asyncio.run, args=(engine.run(),))
+    loop_thread.start()
+    run = threading.Event()
+    run.set()
+    yield run, presented_delays
+    time.sleep(duration)
+    run.clear()
+    engine.stop()
+    loop_thread.join()
+
+ENGINES = {
+    'threaded': run_threaded,
+    'asyncio': run_asyncio,
+}
+
+def tail_latency(target_delay, values):
+    """
+    Get the 99th percentile and maximum deviation of the readings from the target delay.
+    """
+    error = np.abs(np.asarray(values) - target_delay)
+    return float(np.percentile(error, 99)), float(np.max(error))
+
+def benchmark(engine, display_configs, duration, fps, capture_interval, policy=None, buffer='linked_list',
+              data_points=NUM_DATA_POINTS, video=None, timestamps='auto', latency=0.0, jitter=0.0, control_gain=None, drop_rate=0.0,
+              motion=None, motion_threshold=None):
+    """
+    Benchmark one engine, returning the delay statistics of each display and the resource use.
+    With video the engine runs against that recording instead of the synthetic camera.
+    """
+    if video is None:
+        capture = SyntheticCapture(fps, latency=latency, jitter=jitter, drop_rate=drop_rate, motion=motion)
+    else:
+        capture = RecordedCapture(video, fps)
+    displays = make_displays(display_configs)
+    if policy is not None:
+        policy.applied.clear()
+
+    telemetry = Telemetry()
+    runner = ENGINES[engine](capture, displays, duration, capture_interval, policy, buffer, timestamps, control_gain, telemetry,
+                             motion_threshold)
+    run, presented_delays = next(runner)
+    start_cpu = time.process_time()
+    start_time = time.perf_counter()
+    max_threads = threading.active_count()
+    sampler = DelaySampler([display.delay for display in displays], presented_delays, data_points)
+    sampler_thread = threading.Thread(target=sampler.run, args=(run,))
+    sampler_thread.start()
+    max_threads = max(max_threads, threading.active_count())
+    # the sampler waits for the longest delay first, so the engine runs for that long plus duration
+    time.sleep(displays[-1].delay)
+    next(runner, None)
+    sampler_thread.join()
+    capture.release()
+
+    wall_time = time.perf_counter() - start_time
+    result = {
+        'engine': ((engine if buffer == 'linked_list' else f'{engine}/{buffer}') + ('' if policy is None else '+policy')
+                   + ('' if control_gain is None else '+control') + ('' if motion_threshold is None else '+retention')),
+        'sampler': sampler,
+        'stats': [delay_stats(display.delay, sampler.values(x)) for x, display in enumerate(displays)],
+        'tail': [tail_latency(display.delay, sampler.values(x)) for x, display in enumerate(displays)],
+        'samples': sampler.count,
+        'cpu': (time.process_time() - start_cpu) / wall_time,
+        'threads': max_threads,
+        'telemetry': telemetry.snapshot(),
+    }
+    if capture.dropped:
+        result['telemetry']['Capture camera dropped (actual)'] = capture.dropped
+    for prefix in ('Retention', 'Delta buffer'):
+        if result['telemetry'].get(f'{prefix} captured bytes'):
+            result['telemetry'][f'{prefix} stored fraction'] = (result['telemetry'].get(f'{prefix} stored bytes', 0)
+                                                                / result['telemetry'][f'{prefix} captured bytes'])
+    if policy is not None:
+        result['policy'] = '; '.join(f"{role}: {description}" for role, description in policy.applied.items())
+    return result
+
+def timestamp_error(fps, frame_count, latency, jitter, sources=('driver', 'regression', 'arrival')):
+    """
+    Read frames from a synthetic camera with a varying delivery latency and stamp each one with
+    every time stamp source. Returns the errors of each source's stamps from the true capture
+    times in nanoseconds, leaving out the frames the estimators warm up on.
+    """
+    capture = SyntheticCapture(fps, 64, 48, latency, jitter, driver_timestamps=True)
+    clocks = {source: CaptureClock(to_ns(1.0 / fps), source) for source in sources}
+    errors = {source: np.empty(frame_count, np.int64) for source in sources}
+    for x in range(frame_count):
+        capture.read()
+        arrival = time.perf_counter_ns()
+        driver_ms = capture.get(cv2.CAP_PROP_POS_MSEC)
+        for source, clock in clocks.items():
+            errors[source][x] = clock.stamp(arrival, driver_ms) - to_ns(capture.capture_time)
+    warm_up = min(CLOCK_WINDOW // 4, frame_count // 2)
+    return {source: values[warm_up:] for source, values in errors.items()}
+
+def print_timestamp_error(errors):
+    # a constant offset delays every display alike, the spread around it is what shows up as delay jitter
+    print(f"{'source':<12} {'offset ms':>10} {'std dev us':>11} {'p99 us':>9} {'max us':>9}")
+    for source, values in errors.items():
+        spread = np.abs(values - np.median(values))
+        print(f"{source:<12} {np.mean(values) / 1e6:>10.2f} {np.std(values) / 1e3:>11.1f} "
+              f"{np.percentile(spread, 99) / 1e3:>9.1f} {np.max(spread) / 1e3:>9.1f}")
+
+UPDATE_COST_DISPLAYS = (1, 10, 50, 75, 100, 200, 500)  # around the crossover at frame_array.ARRAY_MIN_DISPLAYS
+
+def update_cost(display_counts=UPDATE_COST_DISPLAYS, buffer_seconds=2.0, frame_interval=1.0 / 1000, ticks=500):
+    """
+    Time one cursor update of every display, per display count, with the linked list backend
+    (advance_display per display) and the array backend (one DisplayTable.update).
+    Every display is due on every tick, the worst case for both.
+    Returns (display count, linked list seconds per tick, array seconds per tick) rows.
+    """
+    rows = []
+    for count in display_counts:
+        linked_buffer = delay_cli.DoublyLinkedList()
+        array_buffer = FrameArray()
+        frame_interval_ns = to_ns(frame_interval)
+        start_time = time.perf_counter_ns() - to_ns(buffer_seconds)
+        frame_count = int(buffer_seconds / frame_interval)
+        for x in range(frame_count):
+            linked_buffer.add_to_tail(None, start_time + x * frame_interval_ns)
+            array_buffer.add_to_tail(None, start_time + x * frame_interval_ns)
+        displays = [delay_cli.CaptureDisplay(delay, 30) for delay in np.linspace(0, buffer_seconds * 0.9, count)]
+        for display in displays:
+            display.frame_node = linked_buffer.head_node
+        table = DisplayTable(displays)
+
+        linked_time = 0
+        array_time = 0
+        for tick in range(ticks + 1):
+            now = start_time + (frame_count + tick) * frame_interval_ns
+            linked_buffer.add_to_tail(None, now)
+            array_buffer.add_to_tail(None, now)
+            table.next_due[:] = 0
+
+            start = time.perf_counter()
+            for display in displays:
+                advance_display(display, now)
+            linked = time.perf_counter() - start
+
+            start = time.perf_counter()
+            table.update(array_buffer, now)
+            array = time.perf_counter() - start
+
+            # the first tick moves the cursors from the head of the buffer, leave it out
+            if tick > 0:
+                linked_time += linked
+                array_time += array
+        rows.append((count, linked_time / ticks, array_time / ticks))
+    return rows
+
+def print_update_cost(rows):
+    print(f"{'displays':>8} {'linked list':>12} {'array':>12}   (microseconds per update tick)")
+    for count, linked, array in rows:
+        print(f"{count:>8} {linked * 1e6:>12.1f} {array * 1e6:>12.1f}")
+
+NOISE_PATTERNS = 8  # noise images cycled through by buffer_cost, generating new noise every frame would dominate its run time
+
+def buffer_cost(delays, fps, frame_count, motion=None, noise=0, video=None):
+    """
+    Feed frame_count frames through the raw linked list buffer and the delta buffer, as fast as
+    they can be stored, with a cursor per display delay moving forward one frame per captured
+    frame and presenting it. noise adds up to that many pixel levels of random noise to every
+    frame, like a camera sensor. Returns a row per backend: (backend, mean and peak bytes
+    buffered, CPU seconds per stored frame and per presented frame, largest pixel error).
+    """
+    capture = SyntheticCapture(fps, motion=motion) if video is None else RecordedCapture(video, fps)
+    lags = [round(delay * capture.fps) for delay in delays]
+    keep = max(lags) + 1
+    patterns = [np.random.randint(0, noise + 1, (capture.height, capture.width, 3), np.uint8) for x in range(NOISE_PATTERNS)] if noise else None
+    buffers = {'linked_list': delay_cli.DoublyLinkedList(), 'delta': delay_cli.DoublyLinkedList()}
+    cursors = {name: [None] * len(lags) for name in buffers}
+    decoders = [FrameDecoder() for lag in lags]
+    encoder = DeltaEncoder()
+    store_time = dict.fromkeys(buffers, 0.0)
+    present_time = dict.fromkeys(buffers, 0.0)
+    buffered = {name: [] for name in buffers}
+    raw_bytes = 0
+    groups = {}     # id of each FrameGroup in the delta buffer -> (group, frames of it buffered)
+    presented = 0
+    max_error = 0
+
+    for x in range(frame_count):
+        pixels = capture.next_frame()
+        capture.count += 1
+        if patterns is not None:
+            pixels = cv2.add(pixels, patterns[x % NOISE_PATTERNS])
+        frame = delay_cli.prepare_frame(pixels, 'BGR', None)
+        buffers['linked_list'].add_to_tail(frame, x)
+        raw_bytes += frame.raw.nbytes
+        start = time.process_time()
+        encoded = encoder.encode(frame)
+        store_time['delta'] += time.process_time() - start
+        buffers['delta'].add_to_tail(encoded, x)
+        group, count = groups.get(id(encoded.group), (encoded.group, 0))
+        groups[id(encoded.group)] = (group, count + 1)
+
+        # the oldest frame the longest delay still needs is kept, like delay_cli.cleanup
+        while buffers['linked_list'].head_node.time_stamp < x - keep + 1:
+            raw_bytes -= buffers['linked_list'].remove_head().value.raw.nbytes
+            removed = buffers['delta'].remove_head().value
+            group, count = groups[id(removed.group)]
+            if count == 1:
+                del groups[id(removed.group)]
+            else:
+                groups[id(removed.group)] = (group, count - 1)
+        if x >= keep:
+            buffered['linked_list'].append(raw_bytes)
+            buffered['delta'].append(sum(group.nbytes() for group, count in groups.values()))
+
+        for index, lag in enumerate(lags):
+            if x < lag:
+                continue
+            for name, frame_buffer in buffers.items():
+                node = cursors[name][index]
+                if node is None:
+                    node = frame_buffer.head_node
+                    while node.time_stamp < x - lag:
+                        node = node.next_node
+                else:
+                    node = node.next_node
+                cursors[name][index] = node
+            start = time.process_time()
+            image = cursors['linked_list'][index].value.bgr()
+            present_time['linked_list'] += time.process_time() - start
+            start = time.process_time()
+            decoded = decoders[index].bgr(cursors['delta'][index].value)
+            present_time['delta'] += time.process_time() - start
+            max_error = max(max_error, int(cv2.absdiff(image, decoded).max()))
+            presented += 1
+    capture.release()
+    return [(name, np.mean(buffered[name]) if buffered[name] else 0.0, max(buffered[name], default=0),
+             store_time[name] / frame_count, present_time[name] / max(presented, 1), max_error if name == 'delta' else 0)
+            for name in buffers]
+
+def print_buffer_cost(rows):
+    print(f"{'backend':<12} {'mean MB':>9} {'peak MB':>9} {'store ms':>9} {'present ms':>11} {'max error':>10}")
+    for name, mean_bytes, peak_bytes, store, present, error in rows:
+        print(f"{name:<12} {mean_bytes / 1e6:>9.2f} {peak_bytes / 1e6:>9.2f} {store * 1e3:>9.3f} {present * 1e3:>11.3f} {error:>10}")
+
+def print_report(results):
+    print(f"{'engine':<16} {'target':>8} {'average':>10} {'std dev':>10} {'target std':>10} {'high':>10} {'low':>10} "
+          f"{'p99 error':>10} {'max error':>10}")
+    for result in results:
+        for stats, (p99_error, max_error) in zip(result['stats'], result['tail']):
+            print(f"{result['engine']:<16} {format_value(stats['target_delay']):>8} {format_value(stats['average']):>10} "
+                  f"{format_value(stats['std_dev']):>10} {format_value(stats['target_std_dev']):>10} "
+                  f"{format_value(stats['high']):>10} {format_value(stats['low']):>10} "
+                  f"{format_value(p99_error):>10} {format_value(max_error):>10}")
+    print()
+    for result in results:
+        if 'policy' in result:
+            print(f"{result['engine']:<16} {result['policy']}")
+        print(f"{result['engine']:<16} samples: {result['samples']}, CPU: {result['cpu'] * 100:.1f}% of one core, "
+              f"threads: {result['threads']}")
+        for name, value in sorted(result['telemetry'].items()):
+            print(f"{result['engine']:<16} {name}: {value:g}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the delay engines against a synthetic camera or a recorded video.")
+    parser.add_argument('--engine', action='append', dest='engines', choices=list(ENGINES), help="engine to run, repeat for several (default: all)")
+    parser.add_argument('--display', type=parse_display, action='append', dest='displays', metavar='DELAY:FPS')
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds of sampling per engine")
+    parser.add_argument('--fps', type=float, help="synthetic camera frame rate (default: 30, or the video's own)")
+    parser.add_argument('--video', help="play this recording in a loop instead of the synthetic camera")
+    parser.add_argument('--timestamps', choices=TIMESTAMP_SOURCES, default='auto', help="capture time stamp source of the engines")
+    parser.add_argument('--latency', type=float, help="synthetic camera delivery latency in seconds (default: 0, 0.02 with --timestamp-error)")
+    parser.add_argument('--jitter', type=float, help="extra random delivery latency of up to this many seconds (default: 0, 0.008 with --timestamp-error)")
+    parser.add_argument('--delay-control', dest='delay_control', action='store_true',
+                        help="also run every engine with closed-loop delay correction")
+    parser.add_argument('--control-gain', dest='control_gain', type=float, default=CONTROL_GAIN)
+    parser.add_argument('--motion', type=float, help="make the synthetic camera show a still scene with this fraction of it moving")
+    parser.add_argument('--motion-retention', dest='motion_retention', action='store_true',
+                        help="also run every engine with motion-adaptive frame retention")
+    parser.add_argument('--motion-threshold', dest='motion_threshold', type=float, default=RETENTION_THRESHOLD)
+    parser.add_argument('--drop-rate', dest='drop_rate', type=float, default=0.0, help="fraction of frames the synthetic camera drops")
+    parser.add_argument('--timestamp-error', dest='timestamp_error', action='store_true',
+                        help="measure the capture time stamp error of each time stamp source instead")
+    parser.add_argument('--capture-interval', dest='capture_interval', type=float, default=1.0 / 1000)
+    parser.add_argument('--data-points', dest='data_points', type=int, default=NUM_DATA_POINTS, help="readings per display, sampling stops when reached")
+    parser.add_argument('--data-dir', dest='data_dir', help="write each run's Collected_data.txt and *_delay_data.txt into DATA_DIR/<engine>")
+    parser.add_argument('--buffer', action='append', dest='buffers', choices=BUFFER_BACKENDS, help="frame buffer backend, repeat for several (default: linked_list)")
+    parser.add_argument('--update-cost', dest='update_cost', action='store_true',
+                        help="time the cursor update of each buffer backend for 1 to 500 displays instead")
+    parser.add_argument('--buffer-cost', dest='buffer_cost', action='store_true',
+                        help="compare the memory and CPU cost of the raw linked list and the delta buffer offline instead")
+    parser.add_argument('--noise', type=int, default=0, help="pixel levels of random noise added to the frames of --buffer-cost")
+    parser.add_argument('--affinity', type=parse_affinity, action='append', metavar='ROLE=CORES',
+                        help="also run every engine with this thread pinning, repeat for several roles")
+    parser.add_argument('--fifo', dest='fifo_priority', type=int, metavar='PRIORITY', help="also run every engine with SCHED_FIFO")
+    parser.add_argument('--nice', type=int, help="also run every engine at this nice level")
+    args = parser.parse_args()
+
+    if args.update_cost:
+        print_update_cost(update_cost())
+        exit()
+    if args.buffer_cost:
+        fps = args.fps or (None if args.video else 30.0)
+        delays = [display.delay for display in args.displays] if args.displays else [0, 0.5, 1]
+        print_buffer_cost(buffer_cost(delays, fps, int(args.duration * (fps or 30.0)), args.motion, args.noise, args.video))
+        exit()
+    if args.timestamp_error:
+        fps = args.fps or 30.0
+        print_timestamp_error(timestamp_error(fps, int(args.duration * fps), 0.02 if args.latency is None else args.latency,
+                                              0.008 if args.jitter is None else args.jitter))
+        exit()
+
+    display_configs = args.displays or [parse_display('0:30'), parse_display('0.5:30'), parse_display('1:30')]
+    # with a thread policy every engine runs twice, so its effect on the tail latency can be compared
+    policies = [None]
+    if args.affinity or args.fifo_priority is not None or args.nice is not None:
+        policies.append(ThreadPolicy(dict(args.affinity or []), args.fifo_priority, args.nice, verbose=False))
+    fps = args.fps or (None if args.video else 30.0)
+    # likewise with and without delay correction
+    control_gains = [None, args.control_gain] if args.delay_control else [None]
+    motion_thresholds = [None, args.motion_threshold] if args.motion_retention else [None]
+    results = [benchmark(engine, display_configs, args.duration, fps, args.capture_interval, policy, buffer, args.data_points, args.video,
+                         args.timestamps, args.latency or 0.0, args.jitter or 0.0, control_gain, args.drop_rate,
+                         args.motion, motion_threshold)
+               for engine in (args.engines or list(ENGINES)) for buffer in (args.buffers or ['linked_list']) for policy in policies
+               for control_gain in control_gains for motion_threshold in motion_thresholds]
+    print_report(results)
+    if args.data_dir:
+        for result in results:
+            directory = os.path.join(args.data_dir, result['engine'])
+            os.makedirs(directory, exist_ok=True)
+            result['sampler'].write(directory=directory)
+        print(f"\033[92mDelay data written to {args.data_dir}\033[0m")
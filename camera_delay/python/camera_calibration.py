@@ -1,55 +1,152 @@
 import cv2
 import numpy as np
 import glob
+import os
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 # Define the dimensions of the chessboard
 chessboard_size = (9, 6)
 square_size = 0.025  # The size of a square in your defined unit (meters)
 
+# Corner refinement settings
+subpix_window = (11, 11)
+subpix_criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+# Per-image detection results are cached here so reruns only process new or changed images
+CACHE_DIR = 'calibration_cache'
+
 # Prepare object points, like (0,0,0), (1,0,0), ..., (8,5,0)
 objp = np.zeros((chessboard_size[0] * chessboard_size[1], 3), np.float32)
 objp[:, :2] = np.mgrid[0:chessboard_size[0], 0:chessboard_size[1]].T.reshape(-1, 2)
 objp *= square_size
 
-# Arrays to store object points and image points from all the images
-objpoints = []
-imgpoints = []
+def cache_path(fname):
+    """
+    Get the cache file for an image, keyed by its path, size, modification time and the chessboard size.
+    """
+    stat = os.stat(fname)
+    key = f'{os.path.abspath(fname)}|{stat.st_size}|{stat.st_mtime_ns}|{chessboard_size}'
+    return os.path.join(CACHE_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.npz')
+
+def load_cached(fname):
+    """
+    Load the cached (image_size, corners) of an image, or None if it has not been processed yet.
+    corners is None when no chessboard was found.
+    """
+    path = cache_path(fname)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as cached:
+        return tuple(int(v) for v in cached['image_size']), cached['corners'] if cached['found'] else None
 
-# Get the paths to the calibration images
-images = glob.glob('calibration_images/*.jpg')
+def save_cached(fname, image_size, corners):
+    """
+    Cache the detection result of an image.
+    """
+    found = corners is not None
+    np.savez(cache_path(fname), image_size=image_size, found=found, corners=corners if found else np.zeros(0))
 
-# Ensure that at least one image is processed to define the gray variable
-gray = None
+def init_worker():
+    # each worker handles one image at a time, so keep OpenCV from spawning its own threads
+    cv2.setNumThreads(1)
 
-for fname in images:
-    img = cv2.imread(fname)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+def detect_corners(fname):
+    """
+    Find and refine the chessboard corners of one image. Runs in a worker process.
+    """
+    gray = cv2.imread(fname, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return fname, None, None
 
     # Find the chessboard corners
-    ret, corners = cv2.findChessboardCorners(gray, chessboard_size, None)
+    ret, corners = cv2.findChessboardCorners(gray, chessboard_size,
+                                             cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FAST_CHECK)
+    if not ret:
+        return fname, gray.shape[::-1], None
 
-    # If found, add object points, image points (after refining them)
-    if ret:
-        objpoints.append(objp)
-        imgpoints.append(corners)
+    corners = cv2.cornerSubPix(gray, corners, subpix_window, (-1, -1), subpix_criteria)
+    return fname, gray.shape[::-1], corners
+
+def find_all_corners(images, workers):
+    """
+    Detect the chessboard corners of every image, reusing cached results and
+    spreading the remaining images over a process pool.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    results = {}
+    pending = []
+    for fname in images:
+        cached = load_cached(fname)
+        if cached is None:
+            pending.append(fname)
+        else:
+            results[fname] = cached
+    print(f"{len(results)} cached, {len(pending)} to process")
 
-        # Draw and display the corners
-        cv2.drawChessboardCorners(img, chessboard_size, corners, ret)
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            for fname, image_size, corners in pool.map(detect_corners, pending, chunksize=4):
+                if image_size is None:
+                    print(f"Unable to read {fname}")
+                    continue
+                save_cached(fname, image_size, corners)
+                results[fname] = (image_size, corners)
+    return results
+
+def show_corners(results):
+    """
+    Draw and display the detected corners of each image.
+    """
+    for fname, (image_size, corners) in results.items():
+        if corners is None:
+            continue
+        img = cv2.imread(fname)
+        cv2.drawChessboardCorners(img, chessboard_size, corners, True)
         cv2.imshow('img', img)
         cv2.waitKey(500)
+    cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate a camera from chessboard images.")
+    parser.add_argument('--images', default='calibration_images/*.jpg', help="glob pattern of the calibration images")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="number of detection processes")
+    parser.add_argument('--show', action='store_true', help="display the detected corners of each image (500 ms per image)")
+    args = parser.parse_args()
 
-cv2.destroyAllWindows()
+    # Get the paths to the calibration images
+    images = sorted(glob.glob(args.images))
+    results = find_all_corners(images, args.workers)
 
-# Ensure that the gray variable is defined before proceeding with calibration
-if gray is not None:
-    # Perform camera calibration
-    ret, camera_matrix, dist_coeffs, rvecs, tvecs = cv2.calibrateCamera(objpoints, imgpoints, gray.shape[::-1], None, None)
+    if args.show:
+        show_corners(results)
+
+    # Arrays to store object points and image points from all the images
+    objpoints = []
+    imgpoints = []
+    image_size = None
+    for fname in images:
+        if fname not in results or results[fname][1] is None:
+            continue
+        if image_size is None:
+            image_size = results[fname][0]
+        elif results[fname][0] != image_size:
+            print(f"Skipping {fname}: size {results[fname][0]} differs from {image_size}")
+            continue
+        objpoints.append(objp)
+        imgpoints.append(results[fname][1])
 
-    # Save the calibration results
-    np.savez('calibration_data.npz', camera_matrix=camera_matrix, dist_coeffs=dist_coeffs, rvecs=rvecs, tvecs=tvecs)
+    # Ensure that at least one chessboard was found before proceeding with calibration
+    if image_size is not None:
+        print(f"Calibrating with {len(imgpoints)} of {len(images)} images")
+        # Perform camera calibration
+        ret, camera_matrix, dist_coeffs, rvecs, tvecs = cv2.calibrateCamera(objpoints, imgpoints, image_size, None, None)
 
-    print("Camera matrix:\n", camera_matrix)
-    print("Distortion coefficients:\n", dist_coeffs)
-else:
-    print("No valid images found for calibration.")
+        # Save the calibration results
+        np.savez('calibration_data.npz', camera_matrix=camera_matrix, dist_coeffs=dist_coeffs, rvecs=rvecs, tvecs=tvecs, image_size=image_size)
 
+        print("Camera matrix:\n", camera_matrix)
+        print("Distortion coefficients:\n", dist_coeffs)
+    else:
+        print("No valid images found for calibration.")
@@ -0,0 +1,128 @@
+import cv2
+import os
+import re
+import glob
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+CAMERA_CACHE_FILE = 'camera_cache.json'
+USB_SEARCH_LENGTH = 10  # indices probed when /dev/video* cannot be listed
+
+def list_candidate_indices():
+    """
+    List the camera indices worth probing: the /dev/video* nodes on Linux,
+    otherwise the first USB_SEARCH_LENGTH indices.
+    """
+    nodes = glob.glob('/dev/video*')
+    if not nodes:
+        return list(range(USB_SEARCH_LENGTH))
+    indices = []
+    for node in nodes:
+        match = re.fullmatch(r'/dev/video(\d+)', node)
+        if match:
+            indices.append(int(match.group(1)))
+    return sorted(indices)
+
+def device_identity(camera_index):
+    """
+    Get the identity of a video device from sysfs: the node's device name and the bus path
+    of the device it belongs to. Both are None where sysfs is not available.
+    """
+    sys_path = f'/sys/class/video4linux/video{camera_index}'
+    name = None
+    bus_path = None
+    try:
+        with open(os.path.join(sys_path, 'name')) as f:
+            name = f.read().strip()
+        bus_path = os.path.realpath(os.path.join(sys_path, 'device'))
+    except OSError:
+        pass
+    return {'name': name, 'bus_path': bus_path}
+
+def probe_camera(camera_index):
+    """
+    Open a camera index and describe it. Nodes that cannot be opened (e.g. V4L2 metadata nodes,
+    or a camera another program holds) are reported with available set to False.
+    """
+    camera = device_identity(camera_index)
+    camera['index'] = camera_index
+    camera['available'] = False
+    camera['modes'] = []
+    cap = cv2.VideoCapture(camera_index)
+    try:
+        if not cap.isOpened():
+            return camera
+        camera['available'] = True
+        camera['modes'] = [{
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fps': cap.get(cv2.CAP_PROP_FPS),
+        }]
+        return camera
+    finally:
+        cap.release()
+
+def load_camera_cache(cache_file=CAMERA_CACHE_FILE):
+    try:
+        with open(cache_file) as f:
+            return {int(index): camera for index, camera in json.load(f).items()}
+    except (OSError, ValueError):
+        return {}
+
+def save_camera_cache(cameras, cache_file=CAMERA_CACHE_FILE):
+    with open(cache_file, 'w') as f:
+        json.dump({str(index): camera for index, camera in cameras.items()}, f, indent=2)
+
+def is_cache_valid(camera_index, camera):
+    """
+    Cheap revalidation of a cached camera: the node still exists and still belongs to the same device.
+    Cameras without a sysfs identity cannot be revalidated without opening them.
+    """
+    if camera.get('bus_path') is None:
+        return False
+    return os.path.exists(f'/dev/video{camera_index}') and device_identity(camera_index) == {'name': camera['name'], 'bus_path': camera['bus_path']}
+
+def discover_cameras(use_cache=True, cache_file=CAMERA_CACHE_FILE):
+    """
+    Find the available cameras. Cached cameras whose identity is unchanged are reused
+    without opening them; every other candidate is probed concurrently, including the nodes
+    that failed to open last time, which may have been a camera that was busy then.
+    Returns a dict of camera index to camera description.
+    """
+    cached = load_camera_cache(cache_file) if use_cache else {}
+    cameras = {}
+    to_probe = []
+    for camera_index in list_candidate_indices():
+        camera = cached.get(camera_index)
+        if camera is not None and camera['available'] and is_cache_valid(camera_index, camera):
+            cameras[camera_index] = cached[camera_index]
+        else:
+            to_probe.append(camera_index)
+
+    if to_probe:
+        with ThreadPoolExecutor(max_workers=len(to_probe)) as pool:
+            for camera in pool.map(probe_camera, to_probe):
+                cameras[camera['index']] = camera
+
+    cameras = dict(sorted(cameras.items()))
+    if cameras != cached:
+        save_camera_cache(cameras, cache_file)
+    return {index: camera for index, camera in cameras.items() if camera['available']}
+
+def first_camera_index():
+    """
+    Get the index of the first available camera, None if there is none.
+    """
+    for camera_index in discover_cameras():
+        print(f'\033[92mCamera index available: {camera_index}\033[0m')
+        return camera_index
+    print("\033[91mCamera not detected, terminating\033[0m")
+    return None
+
+def invalidate_camera(camera_index, cache_file=CAMERA_CACHE_FILE):
+    """
+    Drop a camera from the cache, e.g. after it failed to open, so the next discovery probes it again.
+    """
+    cameras = load_camera_cache(cache_file)
+    if cameras.pop(camera_index, None) is not None:
+        save_camera_cache(cameras, cache_file)
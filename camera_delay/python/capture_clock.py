@@ -0,0 +1,87 @@
+import numpy as np
+import cv2
+from collections import deque
+
+# Capture time estimation
+# capture.read() returns after a driver, transfer and decode latency that varies from frame to
+# frame, so stamping frames on arrival adds that variation to every display's delay. CaptureClock
+# estimates when each frame was actually captured, in time.perf_counter_ns() time:
+#   driver      the driver's buffer time stamp (CAP_PROP_POS_MSEC, V4L2 fills it from the buffer),
+#               moved into perf_counter time by the smallest arrival - driver time difference seen
+#   regression  a least squares line through the recent arrival times by frame index, moved down
+#               to the earliest arrivals, for cameras that don't report time stamps
+#   arrival     the time read() returned, the old behaviour
+# 'auto' uses the driver time stamps if they advance from frame to frame, regression otherwise.
+
+TIMESTAMP_SOURCES = ('auto', 'driver', 'regression', 'arrival')
+CLOCK_WINDOW = 120  # frames the driver offset and the regression are estimated over
+
+class CaptureClock:
+    def __init__(self, frame_period_ns, source='auto', window=CLOCK_WINDOW):
+        self.frame_period = frame_period_ns
+        self.source = source
+        self.offsets = deque(maxlen=window)     # driver: arrival - driver time
+        self.indices = deque(maxlen=window)     # regression: frame index and arrival time
+        self.arrivals = deque(maxlen=window)
+        self.index = 0
+        self.count = 0
+        self.last_driver_time = None
+        self.last_arrival = None
+        self.last_estimate = None
+
+    @classmethod
+    def for_capture(cls, capture, source='auto'):
+        """
+        Make a clock for a capture, None for arrival time stamps.
+        """
+        if source == 'arrival':
+            return None
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        return cls(round(1e9 / fps) if fps > 0 else round(1e9 / 30), source)
+
+    def stamp(self, arrival, driver_ms=0.0):
+        """
+        Estimate the capture time of a frame that arrived at arrival (ns), given the driver
+        time stamp the capture reported for it in milliseconds (0 or less if none).
+        """
+        driver_time = round(driver_ms * 1e6) if driver_ms > 0 else None
+        if self.source == 'auto' and self.count > 0:
+            # decided on the second frame: driver time stamps are only usable if they advance
+            advancing = driver_time is not None and self.last_driver_time is not None and driver_time > self.last_driver_time
+            self.source = 'driver' if advancing else 'regression'
+        self.last_driver_time = driver_time
+        self.count += 1
+
+        if self.source == 'driver' and driver_time is not None:
+            self.offsets.append(arrival - driver_time)
+            estimate = driver_time + min(self.offsets)
+        elif self.source in ('auto', 'regression', 'driver'):
+            estimate = self.regression_stamp(arrival)
+        else:
+            estimate = arrival
+        # never after the frame arrived, and never before the previous frame
+        estimate = min(estimate, arrival)
+        if self.last_estimate is not None:
+            estimate = max(estimate, self.last_estimate + 1)
+        self.last_estimate = estimate
+        return estimate
+
+    def regression_stamp(self, arrival):
+        if self.last_arrival is not None:
+            # frames dropped by the camera or the driver skip indices, so the line stays straight
+            self.index += max(1, round((arrival - self.last_arrival) / self.frame_period))
+        self.last_arrival = arrival
+        self.indices.append(self.index)
+        self.arrivals.append(arrival)
+        if len(self.indices) < 3:
+            return arrival
+
+        indices = np.array(self.indices, np.float64)
+        arrivals = np.array(self.arrivals, np.int64)
+        times = (arrivals - arrivals[0]).astype(np.float64)
+        slope, intercept = np.polyfit(indices, times, 1)
+        if len(self.indices) >= 10 and slope > 0:
+            self.frame_period = slope
+        # the earliest arrivals had the least latency, so they are the closest to the capture times
+        residual = np.min(times - (slope * indices + intercept))
+        return int(arrivals[0] + round(slope * self.index + intercept + residual))
@@ -0,0 +1,91 @@
+import numpy as np
+import cv2
+
+# Capture-time cropping and scaling
+# A display can show a region of the camera frame (roi: x, y, width, height in camera pixels) at
+# a target size (width, height). CaptureCrop crops every captured frame once, before it is
+# buffered, to the union of the display regions, scaled down to the largest resolution any
+# display needs. Each display then shows its region of the stored frame as a numpy view, which
+# is only resized when the display needs fewer pixels than were stored.
+# Frames are decoded to BGR at capture to be cropped, so YUYV frames (2 bytes per pixel instead
+# of 3) only get smaller in the buffer when the crop removes more than a third of the pixels.
+
+class CaptureCrop:
+    """
+    Crops a BGR frame to box (x, y, width, height) and scales it by scale (at most 1).
+    """
+    def __init__(self, box, scale, frame_size):
+        self.box = box
+        self.scale = scale
+        self.frame_size = frame_size
+        x, y, width, height = box
+        self.size = (max(round(width * scale), 1), max(round(height * scale), 1))
+
+    def is_identity(self):
+        return self.box == (0, 0, *self.frame_size) and self.size == self.frame_size
+
+    def __call__(self, frame):
+        x, y, width, height = self.box
+        cropped = frame[y:y + height, x:x + width]
+        if self.size != (width, height):
+            return cv2.resize(cropped, self.size, interpolation=cv2.INTER_AREA)
+        # copied, a view would keep the whole captured frame alive in the buffer
+        return np.ascontiguousarray(cropped)
+
+    def region(self, roi):
+        """
+        Get the part of the cropped frame showing roi, as (rows, columns) slices.
+        """
+        x, y, width, height = roi
+        box_x, box_y = self.box[:2]
+        left = round((x - box_x) * self.scale)
+        top = round((y - box_y) * self.scale)
+        right = min(max(round((x - box_x + width) * self.scale), left + 1), self.size[0])
+        bottom = min(max(round((y - box_y + height) * self.scale), top + 1), self.size[1])
+        return slice(top, bottom), slice(left, right)
+
+def clip_roi(roi, frame_size):
+    """
+    Clip a display region to the frame, the whole frame if roi is None.
+    """
+    if roi is None:
+        return (0, 0, *frame_size)
+    x, y, width, height = roi
+    left, top = min(max(x, 0), frame_size[0]), min(max(y, 0), frame_size[1])
+    right, bottom = min(x + width, frame_size[0]), min(y + height, frame_size[1])
+    if right <= left or bottom <= top:
+        raise ValueError(f"Display region {tuple(roi)} is outside the {frame_size[0]}x{frame_size[1]} frame.")
+    return left, top, right - left, bottom - top
+
+def get_capture_crop(displays, frame_size):
+    """
+    Work out the crop covering every display's region at the resolution it needs, and point each
+    display's region at its part of the cropped frames. Returns None if the frames don't need cropping.
+    """
+    if all(display.roi is None and display.size is None for display in displays):
+        return None
+    rois = [clip_roi(display.roi, frame_size) for display in displays]
+    left = min(x for x, y, width, height in rois)
+    top = min(y for x, y, width, height in rois)
+    right = max(x + width for x, y, width, height in rois)
+    bottom = max(y + height for x, y, width, height in rois)
+    # the largest scale any display needs its region at, never above the camera resolution
+    scale = max(1.0 if display.size is None else min(max(display.size[0] / width, display.size[1] / height), 1.0)
+                for display, (x, y, width, height) in zip(displays, rois))
+    crop = CaptureCrop((left, top, right - left, bottom - top), scale, tuple(frame_size))
+    for display, roi in zip(displays, rois):
+        display.region = crop.region(roi)
+    return None if crop.is_identity() else crop
+
+def display_view(display, image):
+    """
+    Get the part of a buffered frame a display shows, at its size. A view of image unless it has to be resized.
+    """
+    if display.region is not None:
+        image = image[display.region]
+    if display.size is not None and (image.shape[1], image.shape[0]) != display.size:
+        if display.scaled is None or display.scaled.shape[:2] != (display.size[1], display.size[0]):
+            display.scaled = np.empty((display.size[1], display.size[0], image.shape[2]), image.dtype)
+        cv2.resize(image, display.size, dst=display.scaled, interpolation=cv2.INTER_AREA)
+        return display.scaled
+    return image
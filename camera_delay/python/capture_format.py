@@ -0,0 +1,146 @@
+import cv2
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+# Pixel formats requested from the camera, in order of preference.
+# MJPG keeps buffered frames compressed, YUYV keeps them at 2 bytes per pixel instead of 3.
+PREFERRED_PIXEL_FORMATS = ('MJPG', 'YUYV')
+
+class LazyFrame:
+    """
+    A captured frame kept in the camera's native pixel format.
+    It is only decoded / converted to BGR the first time a display presents it,
+    and the result is kept so duplicated nodes and other displays reuse it.
+    Every frame gets a sequence id, shared by the nodes that duplicate it, and time_stamp is
+    its estimated capture time (see capture_clock.py), None if it was not estimated.
+    capture_sequence is the frame's number from its camera, which skips dropped frames
+    (see frame_drops.py), None if drops are not tracked.
+    """
+    __slots__ = ('raw', 'pixel_format', 'size', 'sequence', 'time_stamp', 'capture_sequence', '_bgr')
+    sequence_counter = itertools.count()
+
+    def __init__(self, raw, pixel_format='BGR', size=None):
+        self.sequence = next(LazyFrame.sequence_counter)
+        self.raw = raw
+        self.pixel_format = pixel_format
+        self.size = size
+        self.time_stamp = None
+        self.capture_sequence = None
+        self._bgr = raw if pixel_format == 'BGR' else None
+
+    def bgr(self):
+        """
+        Get the frame as a BGR image, decoding it on first use.
+        """
+        if self._bgr is None:
+            self._bgr = decode_frame(self.raw, self.pixel_format, self.size)
+        return self._bgr
+
+def fourcc_to_str(value):
+    """
+    Convert a CAP_PROP_FOURCC value to its four character code.
+    """
+    value = int(value)
+    return ''.join(chr((value >> (8 * i)) & 0xFF) for i in range(4))
+
+def decode_frame(raw, pixel_format, size=None):
+    """
+    Convert a raw frame in the given pixel format to BGR.
+    size is the (width, height) of the frame, needed to reshape packed YUYV buffers.
+    """
+    if pixel_format == 'MJPG':
+        return cv2.imdecode(raw.reshape(-1), cv2.IMREAD_COLOR)
+    if pixel_format == 'YUYV':
+        width, height = size
+        return cv2.cvtColor(raw.reshape(height, width, 2), cv2.COLOR_YUV2BGR_YUYV)
+    return raw
+
+def negotiate_pixel_format(capture, preferred=PREFERRED_PIXEL_FORMATS):
+    """
+    Ask the camera for the first supported format in preferred and turn off OpenCV's
+    automatic BGR conversion. Returns the format capture.read() now delivers, 'BGR'
+    if the camera or backend does not allow raw frames.
+    """
+    for pixel_format in preferred:
+        capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*pixel_format))
+        if fourcc_to_str(capture.get(cv2.CAP_PROP_FOURCC)) != pixel_format:
+            continue
+        if not capture.set(cv2.CAP_PROP_CONVERT_RGB, 0):
+            return 'BGR'
+
+        # some backends accept the property but keep converting, so check what a frame looks like
+        ret, raw = capture.read()
+        if not ret or (raw.ndim == 3 and raw.shape[2] == 3):
+            capture.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+            return 'BGR'
+        return pixel_format
+    return 'BGR'
+
+def get_frame_size(capture):
+    """
+    Get the (width, height) of the frames delivered by a capture.
+    """
+    return int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+class DecodePool:
+    """
+    Decodes compressed MJPG frames on a thread pool (cv2.imdecode releases the GIL, so
+    decoding scales with cores) and hands the results to on_frame in capture order.
+    submit() blocks once max_in_flight frames are waiting, which pushes back on the camera
+    instead of queueing frames without bound.
+    Frames that fail to decode are skipped and counted in telemetry, the first failure is printed.
+    """
+    def __init__(self, workers, on_frame, decode=None, max_in_flight=None, telemetry=None):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mjpg_decode')
+        self.on_frame = on_frame
+        self.decode = decode if decode is not None else (lambda raw: decode_frame(raw, 'MJPG'))
+        self.slots = threading.Semaphore(max_in_flight if max_in_flight else workers * 2)
+        self.lock = threading.Lock()
+        self.next_sequence = 0
+        self.next_release = 0
+        self.decoded = {}
+        self.telemetry = telemetry
+        self.failures = 0
+
+    def submit(self, raw, time_stamp=None, capture_sequence=None):
+        """
+        Queue a compressed frame for decoding, with its capture time stamp and sequence number
+        if they are tracked. Called from the capture thread only.
+        """
+        self.slots.acquire()
+        sequence = self.next_sequence
+        self.next_sequence += 1
+        future = self.executor.submit(self.decode, raw)
+        future.add_done_callback(lambda f: self._decoded(sequence, f, time_stamp, capture_sequence))
+
+    def _decoded(self, sequence, future, time_stamp=None, capture_sequence=None):
+        error = future.exception()
+        frame = future.result() if error is None else None
+        if frame is None:
+            self._failed(sequence, error)
+        elif isinstance(frame, LazyFrame):
+            frame.time_stamp = time_stamp
+            frame.capture_sequence = capture_sequence
+        with self.lock:
+            self.decoded[sequence] = frame
+            # release every frame that is now next in sequence, in order
+            while self.next_release in self.decoded:
+                frame = self.decoded.pop(self.next_release)
+                self.next_release += 1
+                if frame is not None:
+                    self.on_frame(frame)
+                self.slots.release()
+
+    def _failed(self, sequence, error):
+        with self.lock:
+            self.failures += 1
+            first = self.failures == 1
+        if self.telemetry is not None:
+            self.telemetry.count('Decode pool failed frames')
+        if first:
+            reason = f"{type(error).__name__}: {error}" if error is not None else "no image decoded"
+            print(f"\033[91mFrame {sequence} failed to decode and was skipped ({reason}), later failures are only counted\033[0m")
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,80 @@
+import numpy as np
+import cv2
+import math
+
+COMPOSITOR_WINDOW = 'Delay displays'
+LABEL_FONT = cv2.FONT_HERSHEY_SIMPLEX
+LABEL_SCALE = 0.5
+LABEL_PADDING = 4
+
+class Compositor:
+    """
+    Renders every display into tiles of one preallocated canvas, presented in a single window.
+    Frames are resized straight into their tile's slice of the canvas, and each tile's delay
+    label is rendered once and copied back over the tile after every update. Tiles have the
+    camera's aspect ratio; a frame of another shape (a display region, see capture_crop.py) is
+    letterboxed into its tile at its own aspect ratio.
+    """
+    def __init__(self, displays, frame_size, tile_width=320, columns=None, window_name=COMPOSITOR_WINDOW):
+        self.window_name = window_name
+        width, height = frame_size
+        self.tile_size = (tile_width, max(1, round(tile_width * height / width)))
+        tile_width, tile_height = self.tile_size
+        columns = columns or math.ceil(math.sqrt(len(displays)))
+        rows = math.ceil(len(displays) / columns)
+        self.canvas = np.zeros((rows * tile_height, columns * tile_width, 3), np.uint8)
+        self.tiles = {}
+        self.labels = {}
+        self.views = {}  # display -> (frame shape, part of its tile the frame is drawn into)
+        for x, display in enumerate(displays):
+            row, column = divmod(x, columns)
+            # views into the canvas, so writing a tile writes the canvas in place
+            self.tiles[display] = self.canvas[row * tile_height:(row + 1) * tile_height, column * tile_width:(column + 1) * tile_width]
+            self.labels[display] = render_label(f'{display.delay:g}s', tile_width, tile_height)
+        self.dirty = False
+
+    def update(self, display, frame):
+        """
+        Draw a display's frame (a BGR image) into its tile.
+        """
+        tile = self.tiles[display]
+        view = self.view(display, frame.shape[:2])
+        if frame.shape[:2] == view.shape[:2]:
+            np.copyto(view, frame)
+        else:
+            cv2.resize(frame, (view.shape[1], view.shape[0]), dst=view, interpolation=cv2.INTER_LINEAR)
+        label = self.labels[display]
+        tile[:label.shape[0], :label.shape[1]] = label
+        self.dirty = True
+
+    def view(self, display, shape):
+        """
+        Get the part of a display's tile a frame of the given (height, width) fits, centred at its aspect ratio.
+        """
+        cached = self.views.get(display)
+        if cached is not None and cached[0] == shape:
+            return cached[1]
+        tile = self.tiles[display]
+        tile_height, tile_width = tile.shape[:2]
+        height, width = shape
+        scale = min(tile_width / width, tile_height / height)
+        view_width, view_height = max(1, round(width * scale)), max(1, round(height * scale))
+        top, left = (tile_height - view_height) // 2, (tile_width - view_width) // 2
+        tile[:] = 0  # clear the bars around the new view
+        view = tile[top:top + view_height, left:left + view_width]
+        self.views[display] = (shape, view)
+        return view
+
+    def present(self):
+        """
+        Show the canvas if any tile changed since the last call.
+        """
+        if self.dirty:
+            cv2.imshow(self.window_name, self.canvas)
+            self.dirty = False
+
+def render_label(text, tile_width, tile_height):
+    (text_width, text_height), baseline = cv2.getTextSize(text, LABEL_FONT, LABEL_SCALE, 1)
+    label = np.zeros((min(text_height + baseline + 2 * LABEL_PADDING, tile_height), min(text_width + 2 * LABEL_PADDING, tile_width), 3), np.uint8)
+    cv2.putText(label, text, (LABEL_PADDING, LABEL_PADDING + text_height), LABEL_FONT, LABEL_SCALE, (255, 255, 255), 1, cv2.LINE_AA)
+    return label
@@ -0,0 +1,311 @@
+import numpy as np
+import cv2
+import time
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from delay_cli import (DoublyLinkedList, DisplayScheduler, update_display, display_delays, next_frame, capture_lag, prepare_frame, open_capture, configured_displays,
+                       prompt_displays, prepare_windows, key_function, terminate)
+from capture_format import get_frame_size
+from delay_config import load_config
+from delay_data import DelaySampler, NUM_DATA_POINTS, to_seconds
+from undistort import get_undistorter
+from capture_crop import get_capture_crop
+from realtime import thread_policy
+from telemetry import Telemetry
+from compositor import Compositor
+from frame_array import ARRAY_MIN_DISPLAYS, FrameArray, DisplayTable, DueDisplays
+from frame_blend import FrameBlender
+from capture_clock import CaptureClock
+from delay_control import DelayController
+from frame_drops import DropMonitor
+from frame_retention import MotionRetention
+from delta_buffer import DeltaEncoder, FrameDecoder
+
+# asyncio delay engine
+# Same frame buffer and display logic as delay_cli.py, but driven by one event loop instead of
+# one polling thread per task. Blocking capture.read() and the HighGUI calls run in their own
+# single-thread executors (HighGUI must stay on one thread); buffer updates, display cursor
+# updates, cleanup and telemetry are timer-driven coroutines.
+
+class AsyncDelayEngine:
+    def __init__(self, capture, displays, pixel_format='BGR', frame_size=None, undistort=None,
+                 capture_interval=1.0 / 1000, headless=False, record=True, policy=None,
+                 data_points=NUM_DATA_POINTS,
+                 buffer='linked_list', compositor=None, blend=False, timestamps='auto', control_gain=None,
+                 telemetry=None, motion_threshold=None, crop=None):
+        self.capture = capture
+        self.displays = displays
+        self.pixel_format = pixel_format
+        self.frame_size = frame_size
+        self.undistort = undistort
+        self.crop = crop  # see capture_crop.py, None stores the whole frame
+        self.capture_interval = capture_interval
+        self.headless = headless
+        self.record = record
+        self.frame_buffer = FrameArray() if buffer == 'array' else DoublyLinkedList()
+        self.table = None  # display table of the array backend
+        self.latest_frame = None
+        self.clock = CaptureClock.for_capture(capture, timestamps)
+        self.lag = 0            # how long before it entered the buffer the latest frame was captured
+        self.last_stamp = 0
+        self.ready = deque()  # displays with a frame due, waiting for the GUI
+        self.data_points = data_points
+        self.sampler = None
+        self.control_gain = control_gain  # None leaves the delays uncorrected
+        self.controller = None
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+        self.drops = DropMonitor.for_capture('camera', capture, self.telemetry)
+        # None keeps every frame in full
+        self.retention = MotionRetention(motion_threshold, telemetry=self.telemetry) if motion_threshold is not None else None
+        self.encoder = DeltaEncoder(telemetry=self.telemetry) if buffer == 'delta' else None
+        self.compositor = compositor  # only touched on the GUI executor
+        self.blender = FrameBlender() if blend else None
+        self.policy = policy
+        # the executor threads apply their own role of the thread policy when they start
+        self.capture_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='capture',
+                                                   **self.policy_initializer('retrieve'))
+        self.gui_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gui',
+                                               **self.policy_initializer('display'))
+        self.loop = None
+        self.stopped = None
+
+    def policy_initializer(self, role):
+        if self.policy is None:
+            return {}
+        return {'initializer': self.policy.apply, 'initargs': (role,)}
+
+    def start(self, frame):
+        """
+        Seed the buffer with an initial frame and point every display at it.
+        """
+        self.latest_frame = frame
+        self.frame_buffer.add_to_tail(frame, time.perf_counter_ns())
+        if isinstance(self.frame_buffer, FrameArray):
+            self.table = DisplayTable(self.displays)
+            self.table.resolve(np.arange(len(self.displays)), self.frame_buffer)
+            self.ready = DueDisplays(self.table, self.frame_buffer)
+        else:
+            for display in self.displays:
+                display.frame_node = self.frame_buffer.head_node
+                if self.encoder is not None:
+                    display.decoder = FrameDecoder(self.telemetry)
+        if self.record:
+            self.sampler = DelaySampler([display.delay for display in self.displays], self.presented_delays, self.data_points)
+        if self.control_gain is not None:
+            self.controller = DelayController(self.displays, self.presented_delays, self.table, self.telemetry, self.control_gain)
+
+    def stop(self):
+        """
+        Stop the engine. Safe to call from any thread.
+        """
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+    async def every(self, interval, tick):
+        """
+        Call tick every interval seconds on a drift-free schedule.
+        """
+        next_time = self.loop.time()
+        while True:
+            tick(time.perf_counter_ns())
+            next_time += interval
+            delay = next_time - self.loop.time()
+            if delay < 0:
+                # fell behind, restart the schedule instead of bursting to catch up
+                next_time = self.loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    def read_frame(self):
+        """
+        Read a frame and estimate its capture time. Runs on the capture executor, so the
+        arrival time does not include the hand-off to the event loop.
+        """
+        ret, frame = self.capture.read()
+        arrival = time.perf_counter_ns()
+        if not ret:
+            return ret, frame, None, None
+        driver_ms = self.capture.get(cv2.CAP_PROP_POS_MSEC)
+        time_stamp = self.clock.stamp(arrival, driver_ms) if self.clock is not None else None
+        return ret, frame, time_stamp, self.drops.frame(arrival, time_stamp, self.capture.get(cv2.CAP_PROP_POS_FRAMES), driver_ms)
+
+    async def capture_frames(self):
+        while True:
+            ret, frame, time_stamp, capture_sequence = await self.loop.run_in_executor(self.capture_executor, self.read_frame)
+            if not ret:
+                print('\033[91mError: Unable to read frame\033[0m')
+                self.stopped.set()
+                return
+            frame = prepare_frame(frame, self.pixel_format, self.frame_size, self.undistort, self.crop)
+            if frame is None:
+                # undecodable, the buffer keeps repeating the last frame
+                continue
+            frame.time_stamp = time_stamp
+            frame.capture_sequence = capture_sequence
+            if self.retention is not None:
+                frame = self.retention.retain(frame)
+            if self.encoder is not None:
+                # encoding takes milliseconds, too long to block the buffer updates on the event loop
+                frame = await self.loop.run_in_executor(self.capture_executor, self.encoder.encode, frame)
+            self.lag = capture_lag(frame, time.perf_counter_ns())
+            self.latest_frame = frame
+
+    def update_buffer(self, now):
+        # stamped at the capture timeline like delay_cli.capture_frames, kept increasing
+        self.last_stamp = max(now - self.lag, self.last_stamp + 1)
+        self.frame_buffer.add_to_tail(self.latest_frame, self.last_stamp)
+
+    async def update_display_table(self):
+        while True:
+            due = self.table.update(self.frame_buffer, time.perf_counter_ns())
+            if due.size and not self.headless:
+                self.ready.append(due)
+            await asyncio.sleep(max(0, to_seconds(int(self.table.next_deadline()) - time.perf_counter_ns())))
+
+    async def update_displays(self):
+        scheduler = DisplayScheduler(self.displays)
+        while True:
+            now = time.perf_counter_ns()
+            for display in scheduler.pop_due(now):
+                update_display(display, now)
+                if not self.headless:
+                    self.ready.append(display)
+            await asyncio.sleep(max(0, to_seconds(scheduler.next_due() - time.perf_counter_ns())))
+
+    def cleanup(self, now):
+        if self.table is not None:
+            self.frame_buffer.trim(self.table.oldest_cursor())
+            return
+        while self.frame_buffer.head_node and self.frame_buffer.head_node != self.displays[-1].frame_node:
+            self.frame_buffer.remove_head()
+
+    def presented_delays(self):
+        if self.table is not None:
+            return self.table.presented_delays(self.frame_buffer)
+        return display_delays(self.displays)
+
+    async def sample_delays(self):
+        # random-interval sampling like DelaySampler.run, after waiting for the longest delay
+        await asyncio.sleep(max(display.delay for display in self.displays))
+        while True:
+            await asyncio.sleep(self.sampler.next_interval())
+            if not self.sampler.sample():
+                return
+
+    async def control_delays(self):
+        # closed-loop delay correction like DelayController.run, after waiting for the longest delay
+        await asyncio.sleep(max(display.delay for display in self.displays))
+        while True:
+            self.controller.update()
+            await asyncio.sleep(self.controller.next_interval())
+
+    def present(self, displays, now):
+        """
+        Show the frames of the due displays and service the GUI. Runs on the GUI executor.
+        """
+        for display in displays:
+            frame = next_frame(self.frame_buffer, display, now, self.telemetry, self.blender)
+            if frame is None:
+                continue
+            if self.compositor is not None:
+                self.compositor.update(display, frame)
+            else:
+                cv2.imshow(f'Display {display.delay}s delay', frame)
+        if self.compositor is not None:
+            self.compositor.present()
+        return cv2.waitKey(1) & 0xFF
+
+    async def display_frames(self):
+        while True:
+            now = time.perf_counter_ns()
+            displays = {}
+            while self.ready:
+                display = self.ready.popleft()
+                displays[display] = None
+                with display.lock:
+                    display.last_update_time = now
+            key = await self.loop.run_in_executor(self.gui_executor, self.present, list(displays), now)
+            if key == ord('q'):
+                self.stopped.set()
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        if self.policy is not None:
+            # the event loop thread runs the buffer and display cursor updates
+            self.policy.apply('update')
+        tasks = [
+            asyncio.create_task(self.capture_frames()),
+            asyncio.create_task(self.every(self.capture_interval, self.update_buffer)),
+            asyncio.create_task(self.update_displays() if self.table is None else self.update_display_table()),
+            asyncio.create_task(self.every(1.0, self.cleanup)),
+        ]
+        if self.sampler is not None:
+            tasks.append(asyncio.create_task(self.sample_delays()))
+        if self.controller is not None:
+            tasks.append(asyncio.create_task(self.control_delays()))
+        if not self.headless:
+            # windows are created on the GUI executor thread, which does all HighGUI calls
+            await self.loop.run_in_executor(self.gui_executor, prepare_windows, self.displays, self.latest_frame,
+                                           self.compositor)
+            tasks.append(asyncio.create_task(self.display_frames()))
+
+        await self.stopped.wait()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.capture_executor.shutdown(wait=True)
+        self.gui_executor.shutdown(wait=True)
+
+# the delay_config settings this engine honours, load_config rejects the others; frames are
+# decoded on the capture executor, there is no decode pool
+CONFIG_OPTIONS = ('cameras', 'width', 'height', 'pixel_format', 'undistort', 'calibration_file', 'displays',
+                  'buffer', 'capture_interval', 'record', 'data_points', 'data_dir', 'compositor', 'tile_width', 'timestamps',
+                  'delay_control', 'control_gain', 'motion_retention', 'motion_threshold', 'blend', 'affinity', 'fifo_priority', 'nice')
+
+if __name__ == "__main__":
+    config = load_config("Delay a camera feed on one or more displays using an asyncio event loop.",
+                         supported=CONFIG_OPTIONS, single_camera=True)
+    print("\033[2J\033[H")  # Clear screen
+    capture, pixel_format = open_capture(config)
+    frame_size = get_frame_size(capture)
+    max_camera_fps = capture.get(cv2.CAP_PROP_FPS)
+    print(f"\033[93mCapture pixel format: {pixel_format}, max camera FPS: {max_camera_fps}\033[0m")
+
+    displays = configured_displays(config, max_camera_fps) if config.displays else prompt_displays(max_camera_fps)
+    displays.sort(key = key_function)
+    print(displays)
+    if config.buffer == 'array' and len(displays) < ARRAY_MIN_DISPLAYS:
+        print(f"\033[93mWarning: the array buffer updates slower than the linked list below {ARRAY_MIN_DISPLAYS} displays\033[0m")
+
+    undistort = get_undistorter(capture, config.calibration_file) if config.undistort else None
+    crop = get_capture_crop(displays, frame_size)
+
+    ret, frame = capture.read()
+    if not ret:
+        print('\033[91mError: Unable to read initial frame\033[0m')
+        terminate(capture)
+    frame = prepare_frame(frame, pixel_format, frame_size, undistort, crop)
+    if frame is None:
+        print('\033[91mError: Unable to decode initial frame\033[0m')
+        terminate(capture)
+
+    engine = AsyncDelayEngine(capture, displays, pixel_format, frame_size, undistort,
+                              config.capture_interval, record=config.record, data_points=config.data_points,
+                              policy=thread_policy(config), buffer=config.buffer,
+                              compositor=Compositor(displays, frame_size, config.tile_width) if config.compositor else None,
+                              blend=config.blend, timestamps=config.timestamps,
+                              control_gain=config.control_gain if config.delay_control else None,
+                              motion_threshold=config.motion_threshold if config.motion_retention else None,
+                              crop=crop)
+    engine.start(frame)
+    asyncio.run(engine.run())
+    if engine.sampler is not None:
+        engine.sampler.print_stats()
+        engine.sampler.write(directory=config.data_dir)
+    # written with or without --record, drops matter to every run
+    engine.drops.write(directory=config.data_dir)
+    engine.telemetry.print_report()
+    terminate(capture)
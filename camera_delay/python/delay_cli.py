@@ -3,6 +3,27 @@ import cv2
 import time
 import threading
 import functools
+import heapq
+import itertools
+import os
+from collections import deque
+
+from undistort import get_undistorter
+from camera_discovery import first_camera_index
+from capture_format import LazyFrame, DecodePool, decode_frame, negotiate_pixel_format, get_frame_size, PREFERRED_PIXEL_FORMATS
+from delay_config import load_config
+from delay_data import DelaySampler, to_ns, to_seconds
+from realtime import thread_policy, policy_target
+from telemetry import Telemetry
+from compositor import Compositor
+from capture_clock import CaptureClock
+from delay_control import DelayController
+from frame_drops import DropMonitor
+from frame_retention import MotionRetention
+from delta_buffer import DeltaEncoder, FrameDecoder
+from frame_blend import FrameBlender
+from capture_crop import get_capture_crop, display_view
+from frame_array import ARRAY_MIN_DISPLAYS, FrameArray, DisplayTable, DueDisplays, update_display_table, cleanup_table
 
 class Node:
     def __init__(self, value, time_stamp=0, next_node=None, prev_node=None):
@@ -46,14 +67,57 @@ class DoublyLinkedList:
         return self.count
 
 class CaptureDisplay:
-    def __init__(self, delay: float, frame_rate: float):
+    def __init__(self, delay: float, frame_rate: float, roi=None, size=None):
         self.delay = delay
         self.frame_refresh_period = 1.0 / frame_rate
-        self.last_update_time = time.perf_counter()
+        # the engine's timing math uses integer nanoseconds, converted once here
+        self.delay_ns = to_ns(delay)
+        self.correction_ns = 0  # set by delay_control.DelayController to cancel a measured bias
+        self.frame_refresh_period_ns = to_ns(self.frame_refresh_period)
+        self.last_update_time = time.perf_counter_ns()
         self.frame_node = None
+        self.lock = threading.Lock()  # keeps frame_node and last_update_time paired for presented_delay
+        self.shown_sequence = None  # sequence id of the frame in the display's window
+        self.decoder = None  # reconstructs the frames of the delta buffer, see delta_buffer.py
+        self.roi = roi      # part of the camera frame shown and the size it is shown at, see capture_crop.py
+        self.size = size
+        self.region = None  # slices of the buffered frames showing roi, set by get_capture_crop
+        self.scaled = None  # output of the resize to size, when the region has to be resized
     def __repr__(self):
         return f"Display with delay: {self.delay} and refresh period: {self.frame_refresh_period}"
 
+class DisplayScheduler:
+    """
+    Displays in a heap ordered by the time their next frame is due, so a tick only touches
+    the displays that are due and the next deadline is known without scanning the rest.
+    """
+    def __init__(self, displays):
+        self.heap = []
+        self.counter = itertools.count()  # tie breaker, displays themselves are not comparable
+        for display in displays:
+            self.schedule(display, display.last_update_time + display.frame_refresh_period_ns)
+
+    def schedule(self, display, due_time):
+        heapq.heappush(self.heap, (due_time, next(self.counter), display))
+
+    def next_due(self):
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now):
+        """
+        Get the displays due at now, rescheduling each one refresh period later.
+        """
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due_time, _, display = heapq.heappop(self.heap)
+            due_time += display.frame_refresh_period_ns
+            if due_time <= now:
+                # more than a period behind, skip the missed frames instead of bursting
+                due_time = now + display.frame_refresh_period_ns
+            self.schedule(display, due_time)
+            due.append(display)
+        return due
+
 def terminate(capture):
     if capture.isOpened():
         capture.release()
@@ -61,86 +125,186 @@ def terminate(capture):
     exit()
 
 def get_webcam_index():
-    for camera_index in range(10):
-        cap = cv2.VideoCapture(camera_index)
-        if cap.isOpened():
-            print(f'\033[92mCamera index available: {camera_index}\033[0m')
-            cap.release()
-            return camera_index
-    print("\033[91mCamera not detected, terminating\033[0m")
-    terminate(None)
-
-def retrieve_frames(capture, run, read, lock, frame_ref):
+    camera_index = first_camera_index()
+    if camera_index is None:
+        exit()
+    return camera_index
+
+def decode_to_frame(raw, pixel_format, frame_size, undistort=None, crop=None):
+    # None if the frame can't be decoded (a corrupt MJPG buffer)
+    frame = decode_frame(raw, pixel_format, frame_size)
+    if frame is None:
+        return None
+    if undistort is not None:
+        frame = undistort(frame)
+    if crop is not None:
+        frame = crop(frame)
+    return LazyFrame(frame)
+
+def prepare_frame(raw, pixel_format, frame_size, undistort=None, crop=None):
+    # frames stay in the camera format until displayed, unless they have to be undistorted or cropped first
+    if undistort is not None or crop is not None:
+        return decode_to_frame(raw, pixel_format, frame_size, undistort, crop)
+    return LazyFrame(raw, pixel_format, frame_size)
+
+def publish_frame(frame, lock, frame_ref, read):
+    with lock:
+        frame_ref[0] = frame
+    read.set()
+
+def retrieve_frames(capture, run, read, lock, frame_ref, pixel_format='BGR', frame_size=None, undistort=None, decode_pool=None, clock=None,
+                    drops=None, retention=None, encoder=None, crop=None):
     while run.is_set():
         start = time.perf_counter()
         ret, frame = capture.read()
+        arrival = time.perf_counter_ns()
         
         if not ret:
             print('\033[91mError: Unable to read frame\033[0m')
             run.clear()
-        with lock:
-            frame_ref[0] = frame
-        read.set()
+            break
+        driver_ms = capture.get(cv2.CAP_PROP_POS_MSEC)
+        time_stamp = clock.stamp(arrival, driver_ms) if clock is not None else None
+        capture_sequence = drops.frame(arrival, time_stamp, capture.get(cv2.CAP_PROP_POS_FRAMES), driver_ms) if drops is not None else None
+        if decode_pool is not None:
+            # decoded on the pool and published in capture order by publish_frame
+            decode_pool.submit(frame, time_stamp, capture_sequence)
+            continue
+        frame = prepare_frame(frame, pixel_format, frame_size, undistort, crop)
+        if frame is None:
+            # undecodable, the buffer keeps repeating the last frame
+            continue
+        frame.time_stamp = time_stamp
+        frame.capture_sequence = capture_sequence
+        if retention is not None:
+            frame = retention.retain(frame)
+        if encoder is not None:
+            frame = encoder.encode(frame)
+        publish_frame(frame, lock, frame_ref, read)
         #print(time.perf_counter() - start)
 
+def capture_lag(frame, now):
+    # How long before now the frame was captured, 0 if its capture time was not estimated.
+    # The buffer stamps the frame's nodes that much earlier, so displays are delayed from the
+    # capture time instead of from whenever read() happened to return
+    return 0 if frame.time_stamp is None else max(now - frame.time_stamp, 0)
+
 def capture_frames(capture, frame_buffer, frame_interval, read, run, lock, frame_ref):
-    start_time = time.perf_counter()
-    next_time = start_time + frame_interval
+    frame_interval = to_ns(frame_interval)
     correction = 0
+    with lock:
+        frame = frame_ref[0]
+    lag = 0
+    last_stamp = 0
     
     while run.is_set():
-        start_time = time.perf_counter() - correction
+        start_time = time.perf_counter_ns() - correction
         next = start_time + frame_interval
 
+        # without a new frame the last one is added again
         if read.is_set():
             with lock:
                 frame = frame_ref[0]
             read.clear()
-        else:
-            frame = frame_buffer.tail_node.value
+            lag = capture_lag(frame, time.perf_counter_ns())
 
-        now = time.perf_counter()
-        frame_buffer.add_to_tail(frame, now)
+        now = time.perf_counter_ns()
+        # time stamps must keep increasing when the lag grows from one frame to the next
+        last_stamp = max(now - lag, last_stamp + 1)
+        frame_buffer.add_to_tail(frame, last_stamp)
         correction = 0
-        now = time.perf_counter()
+        now = time.perf_counter_ns()
         if next - now > 0:
-            time.sleep((next-now)*0.935)
-        correction = time.perf_counter() - next
-        #print(time.perf_counter() - start_time)
-
-def update_displays(frame_buffer, displays, run):
-    correction = 0
+            time.sleep(to_seconds(next-now)*0.935)
+        correction = time.perf_counter_ns() - next
+
+def advance_display(display, now):
+    # Move the display cursor to the frame whose age is closest to the display delay
+    delay = display.delay_ns - display.correction_ns
+    while display.frame_node and display.frame_node.time_stamp + delay < now:
+        if display.frame_node.next_node is not None:
+            display.frame_node = display.frame_node.next_node
+        else:
+            break
+    if display.frame_node.next_node and abs(delay - (now - display.frame_node.time_stamp)) > abs(delay - (now - display.frame_node.next_node.time_stamp)):
+        display.frame_node = display.frame_node.next_node
+
+def update_display(display, now):
+    # Advance the display's cursor and record the update time together
+    with display.lock:
+        advance_display(display, now)
+        display.last_update_time = now
+
+def presented_delay(display):
+    # The delay the display's current frame was presented with, in nanoseconds. This is not what
+    # collect_data in the C++ DelayCLI samples: the cursor only moves when a frame is due, so its
+    # now - time_stamp also counts the time since the last refresh, half a refresh period on average
+    with display.lock:
+        return display.last_update_time - display.frame_node.time_stamp
+
+def update_displays(frame_buffer, displays, run, ready=None, max_sleep=0.1):
+    # Advance each display's cursor when its next frame is due and hand it to the display thread,
+    # sleeping until the next deadline in between
+    scheduler = DisplayScheduler(displays)
     while run.is_set():
-        start_time = time.perf_counter() - correction
-        next = start_time + frame_interval
-        for display in displays:
-            if start_time - display.last_update_time >= display.frame_refresh_period:
-                while display.frame_node and display.frame_node.time_stamp + display.delay < start_time:
-                    if display.frame_node.next_node is not None:
-                        display.frame_node = display.frame_node.next_node
-                    else:
-                        break
-                if display.frame_node.next_node and abs(display.delay - (start_time- display.frame_node.time_stamp)) > abs(display.delay - (start_time - display.frame_node.next_node.time_stamp)):
-                    display.frame_node = display.frame_node.next_node
-        correction = 0
-        now = time.perf_counter()
-        if next - now > 0:
-            time.sleep((next-now)*0.935)
-        correction = time.perf_counter() - next
-        
-        #print(time.perf_counter() - start_time)
-        
-        
-
+        now = time.perf_counter_ns()
+        for display in scheduler.pop_due(now):
+            update_display(display, now)
+            if ready is not None:
+                ready.append(display)
+        sleep_time = to_seconds(scheduler.next_due() - time.perf_counter_ns())
+        if sleep_time > 0:
+            time.sleep(min(sleep_time, max_sleep))
+
+
+def is_new_frame(display, telemetry=None):
+    # Whether the display's current frame differs from the one already in its window.
+    # Duplicated nodes share the frame, so re-presenting them would only re-upload the same image
+    sequence = display.frame_node.value.sequence
+    if sequence == display.shown_sequence:
+        if telemetry is not None:
+            telemetry.count(f'Display {display.delay}s skipped')
+        return False
+    display.shown_sequence = sequence
+    if telemetry is not None:
+        telemetry.count(f'Display {display.delay}s presented')
+    return True
+
+def current_image(display):
+    # The display's current frame as a BGR image, through its decoder with the delta buffer so
+    # an encoded frame isn't rebuilt from its keyframe
+    value = display.frame_node.value
+    return display.decoder.bgr(value) if display.decoder is not None else value.bgr()
+
+def next_frame(frame_buffer, display, now, telemetry=None, blender=None):
+    # The image to present on the display at now, None if its window already shows it
+    if blender is not None:
+        frame = blender.frame(frame_buffer, display, now, telemetry)
+    elif not is_new_frame(display, telemetry):
+        return None
+    else:
+        frame = current_image(display)
+    return display_view(display, frame) if frame is not None else None
 
-def display_frames(frame_buffer, displays, run):
+def display_frames(frame_buffer, displays, run, ready, telemetry=None, compositor=None, blender=None):
     screenshot_counter = 0
     while run.is_set():
-        now = time.perf_counter()
-        for display in displays:
-            if display.frame_node and now - display.last_update_time >= display.frame_refresh_period:
-                cv2.imshow(f'Display {display.delay}s delay', display.frame_node.value)
-                display.last_update_time = now
+        now = time.perf_counter_ns()
+        shown = set()
+        while ready:
+            display = ready.popleft()
+            if display not in shown:
+                frame = next_frame(frame_buffer, display, now, telemetry, blender)
+                if frame is not None:
+                    if compositor is not None:
+                        compositor.update(display, frame)
+                    else:
+                        cv2.imshow(f'Display {display.delay}s delay', frame)
+                with display.lock:
+                    display.last_update_time = now
+                shown.add(display)
+        if compositor is not None:
+            compositor.present()
                 
 
         key = cv2.waitKey(1) & 0xFF
@@ -149,12 +313,15 @@ def display_frames(frame_buffer, displays, run):
             #terminate(capture)
             run.clear()
         elif key == ord('s'):
-            combined_image = None
-            for display in displays:
-                if combined_image is None:
-                    combined_image = display.frame_node.value
-                else:
-                    combined_image = np.hstack((combined_image, display.frame_node.value))
+            if compositor is not None:
+                combined_image = compositor.canvas
+            else:
+                combined_image = None
+                for display in displays:
+                    if combined_image is None:
+                        combined_image = current_image(display)
+                    else:
+                        combined_image = np.hstack((combined_image, current_image(display)))
             screenshot_counter += 1
             screenshot_name = f'combined_screenshot_{screenshot_counter}.png'
             cv2.imwrite(screenshot_name, combined_image)
@@ -163,11 +330,10 @@ def display_frames(frame_buffer, displays, run):
             time_diffs = []
             with open('display_time_differences.txt', 'a') as f:
                 for display in displays:
-                    time_diffs.append(start_time - display.frame_node.time_stamp if display.frame_node else 0)
+                    time_diffs.append(to_seconds(now - display.frame_node.time_stamp) if display.frame_node else 0)
                 f.write(f'{time_diffs}\n')
             print('\033[92mDisplay time differences saved to display_time_differences.txt\033[0m')
         
-        #print(time.perf_counter() - now)
 
 def cleanup(frame_buffer, displays, run):
     while run.is_set():
@@ -177,21 +343,9 @@ def cleanup(frame_buffer, displays, run):
         time.sleep(1)
 
 
-def record_values(frame_buffer, displays, run):
-    time.sleep(0.25)
-    delay_readings = []
-    for display in displays:
-        delay_readings.append([])
-    while run.is_set():
-        now = time.perf_counter()
-        for x in range(len(displays)):
-            delay_readings[x].append(now-displays[x].frame_node.time_stamp)
-
-        
-        time.sleep(0.25)
-    for x in range(len(displays)):
-        data = np.array(delay_readings[x])
-        print(f"average delay: {np.mean(data)}, standard deviation: {np.std(data)}")
+def display_delays(displays):
+    # The presented delay of every display, in nanoseconds
+    return [presented_delay(display) for display in displays]
 
 
 
@@ -202,13 +356,7 @@ def compare_display(a,b):
         return 1
 key_function = functools.cmp_to_key(compare_display)
 
-
-if __name__ == "__main__":
-    print("\033[2J\033[H")  # Clear screen
-    capture = cv2.VideoCapture(get_webcam_index())
-    max_camera_fps = capture.get(cv2.CAP_PROP_FPS)
-    print(f"\033[93mMax camera FPS: {max_camera_fps}\033[0m")
-
+def prompt_displays(max_camera_fps):
     # Interactive CLI interface with error handling
     while True:
         try:
@@ -242,49 +390,169 @@ if __name__ == "__main__":
                 print(f"\033[91mInvalid input: {e}. Please try again.\033[0m")
         
         displays.append(CaptureDisplay(delay, frame_rate))
-    
+    return displays
+
+def configured_displays(config, max_camera_fps):
+    displays = []
+    for display in config.displays:
+        if display.frame_rate > max_camera_fps:
+            print(f"\033[93mFrame rate {display.frame_rate} of the {display.delay}s display capped at {max_camera_fps} fps\033[0m")
+        displays.append(CaptureDisplay(display.delay, min(display.frame_rate, max_camera_fps), display.roi, display.size))
+    return displays
+
+def open_capture(config):
+    camera_index = config.camera if config.camera is not None else get_webcam_index()
+    capture = cv2.VideoCapture(camera_index)
+    if config.width and config.height:
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, config.width)
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, config.height)
+    if config.pixel_format == 'BGR':
+        pixel_format = 'BGR'
+    else:
+        pixel_format = negotiate_pixel_format(capture, PREFERRED_PIXEL_FORMATS if config.pixel_format == 'auto' else (config.pixel_format,))
+    return capture, pixel_format
+
+def prepare_windows(displays, frame, compositor=None):
+    # Create every window and present the first frame before the engine starts,
+    # so window creation and the first GUI upload are not paid on the first delayed frame
+    if compositor is not None:
+        cv2.namedWindow(compositor.window_name, cv2.WINDOW_AUTOSIZE)
+    for display in displays:
+        if compositor is not None:
+            compositor.update(display, display_view(display, frame.bgr()))
+        else:
+            cv2.namedWindow(f'Display {display.delay}s delay', cv2.WINDOW_AUTOSIZE)
+            cv2.imshow(f'Display {display.delay}s delay', display_view(display, frame.bgr()))
+        display.shown_sequence = frame.sequence
+        display.last_update_time = time.perf_counter_ns()
+    if compositor is not None:
+        compositor.present()
+    cv2.waitKey(1)
+
+
+# the delay_config settings this engine honours, load_config rejects the others
+CONFIG_OPTIONS = ('cameras', 'width', 'height', 'pixel_format', 'decode_threads', 'undistort', 'calibration_file', 'displays',
+                  'buffer', 'capture_interval', 'record', 'data_points', 'data_dir', 'compositor', 'tile_width', 'timestamps',
+                  'delay_control', 'control_gain', 'motion_retention', 'motion_threshold', 'blend', 'affinity', 'fifo_priority', 'nice')
+
+if __name__ == "__main__":
+    config = load_config("Delay a camera feed on one or more displays.", supported=CONFIG_OPTIONS, single_camera=True)
+    print("\033[2J\033[H")  # Clear screen
+    capture, pixel_format = open_capture(config)
+    frame_size = get_frame_size(capture)
+    print(f"\033[93mCapture pixel format: {pixel_format}, resolution: {frame_size[0]}x{frame_size[1]}\033[0m")
+    max_camera_fps = capture.get(cv2.CAP_PROP_FPS)
+    print(f"\033[93mMax camera FPS: {max_camera_fps}\033[0m")
+
+    displays = configured_displays(config, max_camera_fps) if config.displays else prompt_displays(max_camera_fps)
     displays.sort(key = key_function)
     print(displays)
+    if config.buffer == 'array' and len(displays) < ARRAY_MIN_DISPLAYS:
+        print(f"\033[93mWarning: the array buffer updates slower than the linked list below {ARRAY_MIN_DISPLAYS} displays\033[0m")
+
+    frame_interval = config.capture_interval # Interval for capturing frames
+
+    undistort = None
+    if config.undistort is None and os.path.exists(config.calibration_file):
+        config.undistort = input(f"\033[94mApply lens undistortion from {config.calibration_file}? (y/n): \033[0m").strip().lower() == 'y'
+    if config.undistort:
+        undistort = get_undistorter(capture, config.calibration_file)
 
-    frame_interval = 1.0 / 1000 # Interval for capturing frames
+    crop = get_capture_crop(displays, frame_size)
+    if crop is not None:
+        print(f"\033[93mFrames cropped at capture to {crop.size[0]}x{crop.size[1]} from region {crop.box}\033[0m")
 
-    frame_buffer = DoublyLinkedList()
+    frame_buffer = FrameArray() if config.buffer == 'array' else DoublyLinkedList()
     ret, frame = capture.read()
-    frame_ref = [frame]
     if not ret:
         print('\033[91mError: Unable to read initial frame\033[0m')
         terminate(capture)
+    frame = prepare_frame(frame, pixel_format, frame_size, undistort, crop)
+    if frame is None:
+        print('\033[91mError: Unable to decode initial frame\033[0m')
+        terminate(capture)
+    frame_ref = [frame]
 
-    frame_buffer.add_to_tail(frame, time.perf_counter())
+    frame_buffer.add_to_tail(frame, time.perf_counter_ns())
 
-    for display in displays:
-        display.frame_node = frame_buffer.head_node
+    compositor = Compositor(displays, frame_size, config.tile_width) if config.compositor else None
+    prepare_windows(displays, frame, compositor)
+    if config.buffer == 'array':
+        table = DisplayTable(displays)
+        table.resolve(np.arange(len(displays)), frame_buffer)
+    else:
+        for display in displays:
+            display.frame_node = frame_buffer.head_node
     
     run = threading.Event()
     read = threading.Event()
     lock = threading.Lock()
     read.clear()
     run.set()
-    
 
-    capture_thread = threading.Thread(target=capture_frames, args=(capture, frame_buffer, frame_interval, read, run, lock, frame_ref))
-    update_thread = threading.Thread(target=update_displays, args=(frame_buffer, displays, run))
-    retrieve_thread = threading.Thread(target=retrieve_frames, args=(capture,run,read,lock,frame_ref))
-    cleanup_thread = threading.Thread(target=cleanup, args=(frame_buffer, displays, run))
-    record_thread = threading.Thread(target=record_values, args=(frame_buffer, displays, run))
-
-    capture_thread.start()
-    update_thread.start()
-    retrieve_thread.start()
-    cleanup_thread.start()
-    record_thread.start()
-
-    display_frames(frame_buffer, displays, run)
-
-    capture_thread.join()
-    update_thread.join()
-    retrieve_thread.join()
-    cleanup_thread.join()
-    record_thread.join()
+    clock = CaptureClock.for_capture(capture, config.timestamps)
+    telemetry = Telemetry()
+    drops = DropMonitor.for_capture('camera', capture, telemetry)
+    retention = MotionRetention(config.motion_threshold, telemetry=telemetry) if config.motion_retention else None
+    encoder = None
+    if config.buffer == 'delta':
+        encoder = DeltaEncoder(telemetry=telemetry)
+        for display in displays:
+            display.decoder = FrameDecoder(telemetry)
+
+    decode_pool = None
+    if pixel_format == 'MJPG' and config.decode_threads > 0:
+        on_frame = functools.partial(publish_frame, lock=lock, frame_ref=frame_ref, read=read)
+        # the pool hands frames over in capture order, one at a time, so they can be retained and
+        # encoded as they are published, as retrieve_frames does without the pool
+        if encoder is not None:
+            on_frame = lambda frame, publish=on_frame: publish(encoder.encode(frame))
+        if retention is not None:
+            on_frame = lambda frame, publish=on_frame: publish(retention.retain(frame))
+        decode_pool = DecodePool(config.decode_threads, on_frame,
+                                 decode=functools.partial(decode_to_frame, pixel_format=pixel_format, frame_size=frame_size, undistort=undistort, crop=crop),
+                                 telemetry=telemetry)
+    policy = thread_policy(config)
+    capture_thread = threading.Thread(target=policy_target(policy, 'capture', capture_frames), args=(capture, frame_buffer, frame_interval, read, run, lock, frame_ref))
+    retrieve_thread = threading.Thread(target=policy_target(policy, 'retrieve', retrieve_frames), args=(capture,run,read,lock,frame_ref,pixel_format,frame_size,undistort,decode_pool,clock,drops,retention,encoder,crop))
+    # displays with a frame due, handed from the update thread to the display thread
+    if config.buffer == 'array':
+        ready = DueDisplays(table, frame_buffer)
+        update_thread = threading.Thread(target=policy_target(policy, 'update', update_display_table), args=(frame_buffer, table, run, ready))
+        cleanup_thread = threading.Thread(target=policy_target(policy, 'cleanup', cleanup_table), args=(frame_buffer, table, run))
+    else:
+        ready = deque()
+        update_thread = threading.Thread(target=policy_target(policy, 'update', update_displays), args=(frame_buffer, displays, run, ready))
+        cleanup_thread = threading.Thread(target=policy_target(policy, 'cleanup', cleanup), args=(frame_buffer, displays, run))
+    threads = [capture_thread, update_thread, retrieve_thread, cleanup_thread]
+    if config.buffer == 'array':
+        presented_delays = functools.partial(table.presented_delays, frame_buffer)
+    else:
+        presented_delays = functools.partial(display_delays, displays)
+    if config.delay_control:
+        controller = DelayController(displays, presented_delays, table if config.buffer == 'array' else None, telemetry, config.control_gain)
+        threads.append(threading.Thread(target=policy_target(policy, 'control', controller.run), args=(run,)))
+    sampler = None
+    if config.record:
+        sampler = DelaySampler([display.delay for display in displays], presented_delays, config.data_points)
+        threads.append(threading.Thread(target=policy_target(policy, 'record', sampler.run), args=(run,)))
+
+    for thread in threads:
+        thread.start()
+
+    if policy is not None:
+        # applied after the engine threads start so they don't inherit the display policy
+        policy.apply('display')
+    display_frames(frame_buffer, displays, run, ready, telemetry, compositor, FrameBlender() if config.blend else None)
+
+    for thread in threads:
+        thread.join()
+    if decode_pool is not None:
+        decode_pool.shutdown()
+    telemetry.print_report()
+    if sampler is not None:
+        sampler.print_stats()
+        sampler.write(directory=config.data_dir)
+    # written with or without --record, drops matter to every run
+    drops.write(directory=config.data_dir)
     terminate(capture)
-
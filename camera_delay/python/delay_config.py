@@ -0,0 +1,202 @@
+import argparse
+import json
+
+from realtime import THREAD_ROLES, parse_cores
+from capture_clock import TIMESTAMP_SOURCES
+
+BUFFER_BACKENDS = ('linked_list', 'array', 'delta')
+PIXEL_FORMATS = ('auto', 'MJPG', 'YUYV', 'BGR')
+
+class DisplayConfig:
+    """
+    Delay and frame rate of one display, optionally tied to a camera, and the region of the
+    camera frame it shows (x, y, width, height) and the size it shows it at (width, height),
+    see capture_crop.py.
+    """
+    def __init__(self, delay: float, frame_rate: float, camera=None, roi=None, size=None):
+        if delay < 0:
+            raise ValueError("Delay must be a non-negative value.")
+        if frame_rate <= 0:
+            raise ValueError("Frame rate must be a positive value.")
+        if roi is not None and (len(roi) != 4 or min(roi[:2]) < 0 or min(roi[2:]) <= 0):
+            raise ValueError("Region must be x, y, width, height with a positive width and height.")
+        if size is not None and (len(size) != 2 or min(size) <= 0):
+            raise ValueError("Size must be a positive width and height.")
+        self.delay = delay
+        self.frame_rate = frame_rate
+        self.camera = camera
+        self.roi = tuple(int(value) for value in roi) if roi is not None else None
+        self.size = tuple(int(value) for value in size) if size is not None else None
+
+    def __repr__(self):
+        return f"DisplayConfig(delay={self.delay}, frame_rate={self.frame_rate}, camera={self.camera}, roi={self.roi}, size={self.size})"
+
+class DelayConfig:
+    """
+    Settings for a delay engine run. Anything left unset is asked for interactively
+    by the engines, so a partial config only skips the prompts it covers.
+    """
+    def __init__(self):
+        self.cameras = []               # camera indices, empty for auto detection
+        self.width = None               # capture resolution, None keeps the camera default
+        self.height = None
+        self.pixel_format = 'auto'
+        # Threads decoding MJPG frames at capture. 0 keeps frames compressed and decodes them
+        # lazily on display, which is cheaper unless the displays show most captured frames
+        # (e.g. 1080p60 with a 60 fps display), where one display thread cannot keep up.
+        self.decode_threads = 0
+        self.undistort = None           # None asks, True/False skips the prompt
+        self.calibration_file = 'calibration_data.npz'
+        self.displays = []
+        self.buffer = 'linked_list'     # 'array' only pays off from about 60 displays, see frame_array.py
+        self.capture_interval = 1.0 / 1000  # period of the frame buffer update loop
+        self.update_interval = 1.0 / 1000   # period of the polling display update loop in delay_multi.py
+        self.record = True              # sample display delays and write them like the C++ DelayCLI
+        self.data_points = 10000        # readings per display, NUM_DATA_POINTS of the C++ DelayCLI
+        self.data_dir = '.'             # directory of Collected_data.txt and the *_delay_data.txt files
+        self.compositor = False         # tile every display into one window instead of a window each
+        self.tile_width = 320           # compositor tile width, the height keeps the camera aspect ratio
+        self.timestamps = 'auto'        # capture time stamp source, see capture_clock.TIMESTAMP_SOURCES
+        self.delay_control = False      # correct each display's measured delay bias, see delay_control.py
+        self.control_gain = 0.01
+        self.motion_retention = False   # store near-identical frames as references or deltas, see frame_retention.py
+        self.motion_threshold = 4       # block average change in pixel levels that counts as motion
+        self.blend = False              # blend the frames either side of each display's target time
+        self.affinity = {}              # thread role -> cores it may run on, see realtime.THREAD_ROLES
+        self.fifo_priority = None       # SCHED_FIFO priority (1-99) for the timing-critical threads
+        self.nice = None                # nice level for those threads when SCHED_FIFO is not used or refused
+
+    @property
+    def camera(self):
+        return self.cameras[0] if self.cameras else None
+
+    def update(self, values):
+        """
+        Apply settings from a dict, e.g. a parsed config file.
+        """
+        for key, value in values.items():
+            if key == 'displays':
+                self.displays = [display if isinstance(display, DisplayConfig) else DisplayConfig(**display) for display in value]
+            elif key == 'affinity':
+                self.affinity = {role: parse_cores(cores) if isinstance(cores, str) else list(cores) for role, cores in dict(value).items()}
+            elif key == 'camera':
+                self.cameras = [value]
+            elif hasattr(self, key):
+                setattr(self, key, value)
+            else:
+                raise ValueError(f"Unknown config key: {key}")
+        if self.buffer not in BUFFER_BACKENDS:
+            raise ValueError(f"Buffer backend must be one of {BUFFER_BACKENDS}.")
+        if self.motion_retention and self.buffer == 'delta':
+            raise ValueError("Motion retention and the delta buffer backend can't be used together.")
+        if self.pixel_format not in PIXEL_FORMATS:
+            raise ValueError(f"Pixel format must be one of {PIXEL_FORMATS}.")
+        if self.timestamps not in TIMESTAMP_SOURCES:
+            raise ValueError(f"Time stamp source must be one of {TIMESTAMP_SOURCES}.")
+        for role in self.affinity:
+            if role not in THREAD_ROLES:
+                raise ValueError(f"Affinity role must be one of {THREAD_ROLES}.")
+        if self.data_points <= 0:
+            raise ValueError("Data points must be a positive integer.")
+        if self.motion_threshold < 0:
+            raise ValueError("Motion threshold must not be negative.")
+        if not 0 < self.control_gain <= 1:
+            raise ValueError("Delay control gain must be greater than 0 and at most 1.")
+        if self.fifo_priority is not None and not 1 <= self.fifo_priority <= 99:
+            raise ValueError("SCHED_FIFO priority must be between 1 and 99.")
+
+def parse_display(value):
+    """
+    Parse a --display argument of the form DELAY:FPS[:CAMERA][@X,Y,WIDTH,HEIGHT][/WIDTHxHEIGHT],
+    e.g. 0.5:30@320,0,320,240/160x120 for the top right quarter of a 640x480 camera at 160x120.
+    """
+    value, _, size = value.partition('/')
+    value, _, roi = value.partition('@')
+    parts = value.split(':')
+    if len(parts) not in (2, 3):
+        raise argparse.ArgumentTypeError("Display must be given as DELAY:FPS[:CAMERA][@X,Y,WIDTH,HEIGHT][/WIDTHxHEIGHT].")
+    try:
+        return DisplayConfig(float(parts[0]), float(parts[1]), int(parts[2]) if len(parts) == 3 else None,
+                             [int(part) for part in roi.split(',')] if roi else None,
+                             [int(part) for part in size.split('x')] if size else None)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def parse_affinity(value):
+    """
+    Parse an --affinity argument of the form ROLE=CORES, e.g. capture=2 or update=2,3.
+    """
+    role, _, cores = value.partition('=')
+    if role not in THREAD_ROLES or not cores:
+        raise argparse.ArgumentTypeError(f"Affinity must be given as ROLE=CORES with ROLE one of {THREAD_ROLES}.")
+    try:
+        return role, parse_cores(cores)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid core list: {cores}")
+
+def build_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--config', help="JSON config file; command line flags override its values")
+    parser.add_argument('--camera', type=int, action='append', dest='cameras', help="camera index, repeat for several cameras")
+    parser.add_argument('--width', type=int, help="capture width in pixels")
+    parser.add_argument('--height', type=int, help="capture height in pixels")
+    parser.add_argument('--pixel-format', dest='pixel_format', choices=PIXEL_FORMATS)
+    parser.add_argument('--decode-threads', dest='decode_threads', type=int, help="MJPG decode threads at capture, 0 decodes lazily")
+    parser.add_argument('--undistort', dest='undistort', action='store_true', default=None, help="apply lens undistortion")
+    parser.add_argument('--no-undistort', dest='undistort', action='store_false', default=None)
+    parser.add_argument('--calibration-file', dest='calibration_file')
+    parser.add_argument('--display', type=parse_display, action='append', dest='displays', metavar='DELAY:FPS[:CAMERA][@X,Y,W,H][/WxH]',
+                        help="add a display, optionally showing a region of the camera frame at a size, repeat for several displays")
+    parser.add_argument('--buffer', choices=BUFFER_BACKENDS, help="frame buffer backend, array is only faster from about 60 displays (see frame_array.py), "
+                                                            "delta stores frames as keyframes and deltas (see delta_buffer.py)")
+    parser.add_argument('--capture-interval', dest='capture_interval', type=float, help="frame buffer update period in seconds")
+    parser.add_argument('--update-interval', dest='update_interval', type=float, help="display update period in seconds")
+    parser.add_argument('--affinity', type=parse_affinity, action='append', metavar='ROLE=CORES',
+                        help="pin a thread role to cores, repeat for several roles")
+    parser.add_argument('--fifo', dest='fifo_priority', type=int, metavar='PRIORITY', help="request SCHED_FIFO for the timing-critical threads")
+    parser.add_argument('--nice', type=int, help="nice level for the timing-critical threads when SCHED_FIFO is not used")
+    parser.add_argument('--compositor', action='store_true', default=None, help="show every display as a tile of one window")
+    parser.add_argument('--tile-width', dest='tile_width', type=int, help="compositor tile width in pixels")
+    parser.add_argument('--timestamps', choices=TIMESTAMP_SOURCES,
+                        help="how frame capture times are estimated (default: auto, driver time stamps or regression)")
+    parser.add_argument('--delay-control', dest='delay_control', action='store_true', default=None,
+                        help="correct the measured delay error of each display in a closed loop")
+    parser.add_argument('--control-gain', dest='control_gain', type=float, help="delay correction per unit of measured error")
+    parser.add_argument('--motion-retention', dest='motion_retention', action='store_true', default=None,
+                        help="store frames of a still scene as references or changed blocks to save buffer memory")
+    parser.add_argument('--motion-threshold', dest='motion_threshold', type=float,
+                        help="block average change in pixel levels that counts as motion")
+    parser.add_argument('--blend', action='store_true', default=None,
+                        help="blend the two frames either side of each display's delay for sub-frame accuracy")
+    parser.add_argument('--no-record', dest='record', action='store_false', default=None, help="don't record delay statistics")
+    parser.add_argument('--data-points', dest='data_points', type=int, help="delay readings recorded per display")
+    parser.add_argument('--data-dir', dest='data_dir', help="directory the recorded delay data is written to")
+    return parser
+
+def load_config(description, argv=None, supported=None, single_camera=False):
+    """
+    Build the run config from an optional JSON file and the command line flags.
+    supported lists the settings the engine honours, None for all of them; setting any
+    other one, on the command line or in the file, is an error rather than silently ignored.
+    single_camera is for the engines capturing from one camera, naming more is an error too.
+    """
+    parser = build_parser(description)
+    args = parser.parse_args(argv)
+    values = {}
+    if args.config:
+        with open(args.config) as f:
+            values = json.load(f)
+    flags = {key: value for key, value in vars(args).items() if key != 'config' and value is not None}
+    if supported is not None:
+        options = {action.dest: action.option_strings[0] for action in parser._actions if action.option_strings}
+        unsupported = sorted({'cameras' if key == 'camera' else key for key in [*values, *flags]} - set(supported))
+        if unsupported:
+            parser.error(f"not supported by this engine: {', '.join(options.get(key, key) for key in unsupported)}")
+    config = DelayConfig()
+    config.update(values)
+    config.update(flags)
+    if single_camera:
+        cameras = set(config.cameras) | {display.camera for display in config.displays if display.camera is not None}
+        if len(cameras) > 1:
+            parser.error(f"this engine captures from one camera, the config names {sorted(cameras)}")
+    return config
@@ -0,0 +1,66 @@
+import numpy as np
+import time
+import random
+
+from delay_data import REC_INTERVAL_LOW, REC_INTERVAL_HEIGH
+
+# Closed-loop delay compensation
+# Reads the presented delay of every display at random intervals, like DelaySampler, and
+# integrates its error from the target into a per-display correction that the display updates
+# subtract from the delay they select frames at. The gain is small and each step and the total
+# correction are bounded, so only a persistent bias moves the correction and single late
+# frames or stalls barely do.
+
+CONTROL_GAIN = 0.01
+MAX_STEP = 100_000          # ns a single reading may move the correction
+MAX_CORRECTION = 10_000_000 # ns
+
+class DelayController:
+    """
+    Per-display delay corrections, in nanoseconds. They are written to each display's correction_ns,
+    and with a DisplayTable to its correction array as well.
+    presented_delays is a callable returning the current delay of every display in nanoseconds.
+    """
+    def __init__(self, displays, presented_delays, table=None, telemetry=None, gain=CONTROL_GAIN,
+                 max_step=MAX_STEP, max_correction=MAX_CORRECTION):
+        self.displays = displays
+        self.presented_delays = presented_delays
+        self.table = table
+        self.telemetry = telemetry
+        self.gain = gain
+        self.max_step = max_step
+        self.max_correction = max_correction
+        self.targets = np.array([display.delay_ns for display in displays], np.int64)
+        # a display can't select frames from the future, so the correction never takes its delay below 0
+        self.upper = np.minimum(self.targets, max_correction)
+        self.corrections = np.zeros(len(displays))
+
+    def update(self):
+        """
+        Take one reading of every display and move its correction toward the error.
+        """
+        errors = np.asarray(self.presented_delays()) - self.targets
+        step = np.clip(self.gain * errors, -self.max_step, self.max_step)
+        self.corrections = np.clip(self.corrections + step, -self.max_correction, self.upper)
+        corrections = np.round(self.corrections).astype(np.int64)
+        if self.table is not None:
+            self.table.correction[:] = corrections
+        # also read by FrameBlender, which picks its own frames with either backend
+        for display, correction in zip(self.displays, corrections):
+            display.correction_ns = int(correction)
+        if self.telemetry is not None:
+            for display, correction in zip(self.displays, corrections):
+                self.telemetry.set(f'Display {display.delay}s delay correction us', correction / 1000)
+
+    def next_interval(self):
+        return random.randint(REC_INTERVAL_LOW, REC_INTERVAL_HEIGH) / 1_000_000
+
+    def run(self, run):
+        """
+        Update the corrections until run is cleared. Waits for the longest delay first, before
+        which the displays can't show frames as old as their delay yet.
+        """
+        time.sleep(max(display.delay for display in self.displays))
+        while run.is_set():
+            self.update()
+            time.sleep(self.next_interval())
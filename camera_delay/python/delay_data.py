@@ -0,0 +1,160 @@
+import numpy as np
+import os
+import time
+import random
+
+DATA_FILE_NAME = "Collected_data.txt"
+NS_PER_SECOND = 1_000_000_000
+# sampling of the C++ DelayCLI collect_data: random intervals in microseconds, and the number of readings
+REC_INTERVAL_LOW = 50
+REC_INTERVAL_HEIGH = 10000
+NUM_DATA_POINTS = 10000
+
+def to_ns(seconds):
+    """
+    Convert seconds to integer nanoseconds, the unit of the engines' time stamps (time.perf_counter_ns).
+    """
+    return round(seconds * NS_PER_SECOND)
+
+def to_seconds(ns):
+    """
+    Convert nanoseconds (a number or an array) to float seconds.
+    """
+    return ns / NS_PER_SECOND
+
+def format_value(value):
+    """
+    Format a number the way the C++ DelayCLI streams doubles (6 significant digits).
+    """
+    return f"{value:g}"
+
+def delay_stats(target_delay, values):
+    """
+    Compute the statistics reported in Collected_data.txt for one target delay.
+    """
+    data = np.asarray(values, dtype=np.float64)
+    average = float(np.mean(data))
+    return {
+        "target_delay": target_delay,
+        "average": average,
+        "std_dev": float(np.sqrt(np.mean((data - average) ** 2))),
+        "target_std_dev": float(np.sqrt(np.mean((data - target_delay) ** 2))),
+        "high": float(np.max(data)),
+        "low": float(np.min(data)),
+    }
+
+def write_delay_data(data_sets, data_file_name=DATA_FILE_NAME, directory="."):
+    """
+    Write collected delay readings in the same format as cpp/Delay_Cli/data.
+    data_sets is a list of (target_delay, values) pairs, values in seconds.
+    One summary line per target goes into data_file_name and the raw readings
+    go into '<target>s_delay_data.txt'.
+    """
+    with open(f"{directory}/{data_file_name}", 'w') as data_file:
+        for target_delay, values in data_sets:
+            if len(values) == 0:
+                continue
+            stats = delay_stats(target_delay, values)
+            data_file.write(
+                f"Target delay: {format_value(target_delay)}; "
+                f"Average: {format_value(stats['average'])}; "
+                f"Std dev: {format_value(stats['std_dev'])}; "
+                f"Target Std dev: {format_value(stats['target_std_dev'])}; "
+                f"High: {format_value(stats['high'])}; "
+                f"Low: {format_value(stats['low'])}\n")
+            with open(f"{directory}/{format_value(target_delay)}s_delay_data.txt", 'w') as raw_data_file:
+                raw_data_file.write(f"Target Delay: {format_value(target_delay)}\n[ ")
+                raw_data_file.write(", ".join(format_value(value) for value in values))
+                raw_data_file.write("]")
+
+def read_delay_data(directory):
+    """
+    Read the raw readings written by write_delay_data or the C++ DelayCLI from a directory
+    and its subdirectories (cpp/Delay_Cli/data keeps one per target delay).
+    Returns (target_delay, values) pairs sorted by target delay, values in seconds.
+    """
+    data_sets = []
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            if not name.endswith("s_delay_data.txt"):
+                continue
+            with open(os.path.join(root, name)) as raw_data_file:
+                header, values = raw_data_file.read().split("\n", 1)
+            target_delay = float(header.split(":")[1])
+            values = values.strip().lstrip("[").rstrip("]")
+            data_sets.append((target_delay, np.array([float(value) for value in values.split(",") if value.strip()])))
+    data_sets.sort(key=lambda data_set: data_set[0])
+    return data_sets
+
+class DelaySampler:
+    """
+    Samples the delay of every display at random intervals between REC_INTERVAL_LOW and
+    REC_INTERVAL_HEIGH microseconds, like collect_data in the C++ DelayCLI, so the sampling
+    does not alias with the frame timing. Readings go into a preallocated array of
+    num_data_points per display; sampling stops once it is full.
+    presented_delays is a callable returning the current delay of every display in nanoseconds.
+    The engines pass the delay each display's frame was presented with at its last refresh
+    (delay_cli.presented_delay), while collect_data samples now - time_stamp, which also counts
+    the time since the refresh; the readings are not directly comparable with the C++ data.
+    """
+    def __init__(self, target_delays, presented_delays, num_data_points=NUM_DATA_POINTS,
+                 interval_low=REC_INTERVAL_LOW, interval_high=REC_INTERVAL_HEIGH):
+        self.target_delays = list(target_delays)
+        self.presented_delays = presented_delays
+        self.interval_low = interval_low
+        self.interval_high = interval_high
+        self.readings = np.empty((len(self.target_delays), num_data_points), np.int64)
+        self.count = 0
+
+    def is_full(self):
+        return self.count == self.readings.shape[1]
+
+    def next_interval(self):
+        """
+        Get a random time to wait before the next reading, in seconds.
+        """
+        return random.randint(self.interval_low, self.interval_high) / 1_000_000
+
+    def sample(self):
+        """
+        Take one reading of every display. Returns False once the readings are full.
+        """
+        if self.is_full():
+            return False
+        self.readings[:, self.count] = self.presented_delays()
+        self.count += 1
+        return True
+
+    def run(self, run):
+        """
+        Sample until the readings are full or run is cleared. Waits for the longest delay first,
+        so every display shows delayed frames before sampling starts.
+        """
+        time.sleep(max(self.target_delays, default=0))
+        while run.is_set():
+            time.sleep(self.next_interval())
+            if not run.is_set() or not self.sample():
+                break
+
+    def values(self, index):
+        """
+        Get the readings of one display so far, in seconds.
+        """
+        return to_seconds(self.readings[index, :self.count])
+
+    def data_sets(self):
+        return [(target_delay, self.values(x)) for x, target_delay in enumerate(self.target_delays)]
+
+    def write(self, data_file_name=DATA_FILE_NAME, directory="."):
+        """
+        Write the readings in the format of cpp/Delay_Cli/data.
+        """
+        write_delay_data(self.data_sets(), data_file_name, directory)
+
+    def print_stats(self):
+        for target_delay, values in self.data_sets():
+            if len(values) == 0:
+                continue
+            stats = delay_stats(target_delay, values)
+            print(f"target delay: {format_value(target_delay)}, average presented delay: {stats['average']}, "
+                  f"standard deviation: {stats['std_dev']}, readings: {len(values)}")
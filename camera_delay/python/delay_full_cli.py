@@ -4,6 +4,9 @@ import time
 import threading
 import curses
 
+from camera_discovery import discover_cameras
+from delay_config import load_config
+
 class Node:
     def __init__(self, value, time_stamp=0, next_node=None, prev_node=None):
         self.value = value
@@ -67,16 +70,7 @@ def terminate(captures, terminate_event):
     exit()
 
 def get_webcam_index():
-    available_cameras = []
-    for camera_index in range(10):
-        cap = cv2.VideoCapture(camera_index)
-        if cap.isOpened():
-            available_cameras.append(camera_index)
-            cap.release()
-        else:
-            print("\033[A\033[2K\033[A\033[2K",end="")
-
-    return available_cameras
+    return list(discover_cameras())
 
 def capture_frames(displays, frame_buffer, frame_interval, terminate_event, captures):
     while not terminate_event.is_set():
@@ -438,17 +432,35 @@ def capture_selection_menu(stdscr, available_cameras):
             else:
                 selected_captures.append(available_cameras[current_position])
 
-if __name__ == "__main__":
-    available_cameras = get_webcam_index()
-    if not available_cameras:
-        print("Camera not detected, terminating")
-        terminate([], threading.Event())
+# the delay_config settings this engine honours, load_config rejects the others
+CONFIG_OPTIONS = ('cameras', 'width', 'height', 'displays', 'capture_interval')
 
-    selected_captures = curses.wrapper(capture_selection_menu, available_cameras)
+if __name__ == "__main__":
+    config = load_config("Delay several camera feeds on configurable displays.", supported=CONFIG_OPTIONS)
+    if config.cameras:
+        selected_captures = config.cameras
+    else:
+        available_cameras = get_webcam_index()
+        if not available_cameras:
+            print("Camera not detected, terminating")
+            terminate([], threading.Event())
+        selected_captures = curses.wrapper(capture_selection_menu, available_cameras)
+    for display in config.displays:
+        if display.camera is not None and display.camera not in selected_captures:
+            raise ValueError(f"Camera {display.camera} of the {display.delay}s display is not one of the selected cameras {selected_captures}.")
     captures = [cv2.VideoCapture(idx) for idx in selected_captures]
-
-    displays = []  # Start with no active displays
-    frame_interval = 1.0 / 30
+    for capture in captures:
+        if config.width and config.height:
+            capture.set(cv2.CAP_PROP_FRAME_WIDTH, config.width)
+            capture.set(cv2.CAP_PROP_FRAME_HEIGHT, config.height)
+
+    displays = []  # Start with the configured displays, if any
+    for display in config.displays:
+        # displays refer to cameras by their position in captures, the first one if they don't name one
+        camera_index = selected_captures.index(display.camera) if display.camera is not None else 0
+        displays.append(CaptureDisplay(display.delay, display.frame_rate, camera_index))
+        cv2.namedWindow(f'Display {display.delay}s delay (Camera {camera_index})', cv2.WINDOW_AUTOSIZE)
+    frame_interval = config.capture_interval
 
     frame_buffer = DoublyLinkedList()
 
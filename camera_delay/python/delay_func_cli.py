@@ -4,6 +4,8 @@ import time
 import threading
 import curses
 
+from camera_discovery import discover_cameras, invalidate_camera
+
 class Node:
     """
     A class representing a node in a doubly linked list.
@@ -76,6 +78,197 @@ class CaptureDisplay:
         """
         self.frame_refresh_period = 1.0 / frame_rate
 
+class QuiesceBarrier:
+    """
+    Pause/resume protocol between the menu and the capture and display threads.
+    Worker threads call checkpoint() once per loop iteration; pause() returns once every
+    worker is parked there and resume() releases them. Parked threads wait on a condition
+    variable instead of polling. The time spent pausing and paused is kept, for the last pause
+    and the longest, and reported by summary().
+    """
+    def __init__(self, parties):
+        self.parties = parties
+        self.condition = threading.Condition()
+        self.paused = False
+        self.parked = 0
+        self.pause_start = 0.0
+        self.quiesce_time = 0.0  # time pause() waited for the workers to park
+        self.stall_time = 0.0    # time the workers were parked, from pause() to resume()
+        self.pauses = 0
+        self.max_quiesce_time = 0.0
+        self.max_stall_time = 0.0
+
+    def checkpoint(self):
+        """
+        Park the calling worker while a pause is requested.
+        """
+        if not self.paused:  # unlocked fast path, the flag is re-checked under the lock
+            return
+        with self.condition:
+            if not self.paused:
+                return
+            self.parked += 1
+            self.condition.notify_all()
+            self.condition.wait_for(lambda: not self.paused)
+            self.parked -= 1
+
+    def pause(self, timeout=1.0):
+        """
+        Request a pause and wait until all workers are parked.
+        Returns False if they did not all park within timeout, e.g. because they have exited;
+        the pause is then called off, so the caller must not touch what the workers use.
+        """
+        start_time = time.perf_counter()
+        with self.condition:
+            self.paused = True
+            parked = self.condition.wait_for(lambda: self.parked == self.parties, timeout)
+            if not parked:
+                # release the workers that did park, none of them may stay parked without a resume()
+                self.paused = False
+                self.condition.notify_all()
+        self.pause_start = time.perf_counter()
+        self.quiesce_time = self.pause_start - start_time
+        self.max_quiesce_time = max(self.max_quiesce_time, self.quiesce_time)
+        return parked
+
+    def resume(self):
+        """
+        Release the parked workers.
+        """
+        with self.condition:
+            self.paused = False
+            self.condition.notify_all()
+        self.stall_time = time.perf_counter() - self.pause_start
+        self.max_stall_time = max(self.max_stall_time, self.stall_time)
+        self.pauses += 1
+
+    def summary(self):
+        return (f"{self.pauses} pauses, longest wait for the threads to park {self.max_quiesce_time * 1000:.1f} ms, "
+                f"longest stall {self.max_stall_time * 1000:.1f} ms")
+
+class CameraSwitch:
+    """
+    A requested camera switch. done is set once the new camera is live or has failed to open.
+    """
+    def __init__(self, camera_index):
+        self.camera_index = camera_index
+        self.capture = None
+        self.error = None
+        self.busy = False       # the camera failed to open or read, maybe because the current one holds the device
+        self.request_time = time.perf_counter()
+        self.switch_time = 0.0  # time from the request until the camera was live
+        self.done = threading.Event()
+
+    def fail(self, error, busy=False):
+        self.error = error
+        self.busy = busy
+        self.done.set()
+
+class CameraSwitcher:
+    """
+    Opens and warms up a new camera on a background thread while the current one keeps
+    feeding the buffer. The capture thread then swaps it in between two frames, so displays
+    never blank and their cursors keep honouring their delays across the switch.
+    """
+    WARMUP_FRAMES = 3  # frames read and dropped so exposure has settled when the camera goes live
+    SWITCH_TIMEOUT = 10.0  # seconds a switch may take to go live before it is given up
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ready = None
+        self.current_index = None
+
+    def request(self, camera_index):
+        """
+        Start switching to a camera and return the CameraSwitch tracking it.
+        """
+        switch = CameraSwitch(camera_index)
+        if camera_index == self.current_index:
+            switch.fail(f"Camera {camera_index} is already selected")
+        else:
+            threading.Thread(target=self.open_camera, args=(switch,), daemon=True).start()
+        return switch
+
+    def open_camera(self, switch):
+        """
+        Open and warm up the requested camera, then queue it for the capture thread.
+        """
+        capture = cv2.VideoCapture(switch.camera_index)
+        if not capture.isOpened():
+            invalidate_camera(switch.camera_index)
+            switch.fail(f"Unable to open camera with index: {switch.camera_index}", busy=True)
+            return
+        for _ in range(self.WARMUP_FRAMES):
+            ret, frame = capture.read()
+            if not ret:
+                capture.release()
+                switch.fail("Error: Unable to read initial frame", busy=True)
+                return
+
+        switch.capture = capture
+        with self.lock:
+            if switch.done.is_set():
+                # given up while it warmed up
+                capture.release()
+                return
+            superseded, self.ready = self.ready, switch
+        if superseded is not None:
+            superseded.capture.release()
+            superseded.fail(f"Superseded by camera {switch.camera_index}")
+
+    def swap(self, capture_ref):
+        """
+        Swap in a ready camera. Called by the capture thread between frames.
+        """
+        with self.lock:
+            # checked under the lock, give_up can clear it at any time
+            if self.ready is None:
+                return
+            switch, self.ready = self.ready, None
+            # marked live under the lock, so wait() can't give it up while it goes live
+            switch.switch_time = time.perf_counter() - switch.request_time
+            switch.done.set()
+        old_capture = capture_ref[0]
+        capture_ref[0] = switch.capture
+        self.current_index = switch.camera_index
+        if old_capture.isOpened():
+            # releasing can block for a while, keep it off the capture thread
+            threading.Thread(target=old_capture.release, daemon=True).start()
+
+    def wait(self, switch, terminate_event, timeout=SWITCH_TIMEOUT):
+        """
+        Wait until a switch is live or has failed. It is given up if the engine terminates,
+        or the capture thread doesn't swap it in within timeout. Returns True if it went live.
+        """
+        deadline = time.perf_counter() + timeout
+        while not switch.done.wait(0.1):
+            if terminate_event.is_set():
+                self.give_up(switch, "Stopped before the camera went live")
+            elif time.perf_counter() > deadline:
+                self.give_up(switch, f"Camera {switch.camera_index} not live after {timeout:g} s")
+        return switch.error is None
+
+    def give_up(self, switch, error):
+        with self.lock:
+            if switch.done.is_set():
+                return
+            if self.ready is switch:
+                self.ready = None
+                switch.capture.release()
+            switch.fail(error)
+
+    def release_current(self, capture_ref, quiesce):
+        """
+        Release the current camera, for a device that can't be opened while another is in use.
+        Returns False if the capture thread couldn't be paused for it.
+        """
+        if not quiesce.pause():
+            return False
+        capture_ref[0].release()
+        self.current_index = None
+        quiesce.resume()
+        return True
+
 def terminate(capture, terminate_event):
     """
     Terminate the capture and close all windows.
@@ -91,29 +284,19 @@ def get_webcam_indices():
     """
     Get a list of available webcam indices.
     """
-    available_indices = []
-    for camera_index in range(10):
-        cap = cv2.VideoCapture(camera_index)
-        if cap.isOpened():
-            available_indices.append(camera_index)
-            cap.release()
-        else:
-            print("\033[A\033[2K\033[A\033[2K",end="")
+    return list(discover_cameras())
 
-    return available_indices
-
-def capture_frames(capture_ref, frame_buffer, frame_interval, thread_events):
+def capture_frames(capture_ref, frame_buffer, frame_interval, thread_events, quiesce, switcher):
     """
     Capture frames from the webcam and add them to the frame buffer.
     """
     while not thread_events[0].is_set():
-        if thread_events[1].is_set():
-            thread_events[2].set()
-            while thread_events[1].is_set():
-                time.sleep(0.001)
-            thread_events[2].clear()
+        quiesce.checkpoint()
+        switcher.swap(capture_ref)
 
-        if capture_ref[0].isOpened():
+        if not capture_ref[0].isOpened():
+            time.sleep(frame_interval)
+        else:
             start_time = time.perf_counter()
             
             ret, frame = capture_ref[0].read()
@@ -134,20 +317,17 @@ def capture_frames(capture_ref, frame_buffer, frame_interval, thread_events):
             while (time.perf_counter() - start_time) < frame_interval:
                 pass
 
-def display_frames(frame_buffer, displays, thread_events):
+def display_frames(frame_buffer, displays, thread_events, quiesce):
     """
     Display frames from the buffer according to the settings in displays.
     """
     screenshot_counter = 0
     while not thread_events[0].is_set():
-        if thread_events[1].is_set():
-            thread_events[3].set()
-            while thread_events[1].is_set():
-                time.sleep(0.001)
-            thread_events[3].clear()
-
+        quiesce.checkpoint()
 
-        if displays:
+        if not displays:
+            time.sleep(0.001)
+        else:
             now = time.perf_counter()
 
             for display in displays:
@@ -188,7 +368,7 @@ def display_frames(frame_buffer, displays, thread_events):
                 #print('Display time differences saved to display_time_differences.txt')
 
 
-def menu(stdscr, displays, thread_events, capture_ref, frame_buffer, camera_indices):
+def menu(stdscr, displays, thread_events, capture_ref, frame_buffer, camera_indices, quiesce, switcher):
     """
     Display the main menu for configuring displays and selecting a camera.
     """
@@ -245,18 +425,18 @@ def menu(stdscr, displays, thread_events, capture_ref, frame_buffer, camera_indi
             current_display = (current_display - 1) % (len(displays) + 2)
         elif key == ord('\n'):
             if not capture_ref[0].isOpened() or current_display == len(displays) + 1:
-                select_camera(stdscr, capture_ref, displays, frame_buffer, camera_indices, thread_events)
+                select_camera(stdscr, camera_indices, switcher, capture_ref, thread_events[0], quiesce)
             elif current_display == len(displays):
-                add_display(stdscr, displays, capture_ref[0], frame_buffer)
+                add_display(stdscr, displays, capture_ref[0], frame_buffer, quiesce)
             else:
-                modify_display(stdscr, displays[current_display], thread_events)
+                modify_display(stdscr, displays, displays[current_display], thread_events[0], quiesce)
         elif key == ord('q'):
             thread_events[0].set()
 
     curses.endwin()  # Ensure curses window is closed correctly on exit
 
 
-def add_display(stdscr, displays, capture, frame_buffer):
+def add_display(stdscr, displays, capture, frame_buffer, quiesce):
     """
     Add a new display configuration.
     """
@@ -277,11 +457,19 @@ def add_display(stdscr, displays, capture, frame_buffer):
         if frame_rate <= 0 or frame_rate > max_camera_fps:
             raise ValueError(f"Frame rate must be a positive value and not exceed {max_camera_fps} fps.")
         new_display = CaptureDisplay(delay, frame_rate)
-        if displays:
-            new_display.frame_node = displays[0].frame_node  # Assign the current head frame to the new display
+        # the display thread iterates over displays, so only change the list while it is parked
+        if quiesce.pause():
+            if displays:
+                new_display.frame_node = displays[0].frame_node  # Assign the current head frame to the new display
+            else:
+                new_display.frame_node = frame_buffer.head_node
+            displays.append(new_display)
+            quiesce.resume()
         else:
-            new_display.frame_node = frame_buffer.head_node
-        displays.append(new_display)
+            stdscr.attron(curses.color_pair(2))
+            stdscr.addstr(4, 0, "The capture and display threads did not pause, the display was not added. Press any key to continue.")
+            stdscr.attroff(curses.color_pair(2))
+            stdscr.getch()
     except ValueError as e:
         stdscr.attron(curses.color_pair(2))
         stdscr.addstr(4, 0, f"Invalid input: {e}. Press any key to continue.")
@@ -291,7 +479,7 @@ def add_display(stdscr, displays, capture, frame_buffer):
     curses.noecho()
     curses.curs_set(0)
 
-def select_camera(stdscr, capture_ref, displays, frame_buffer, camera_indices, thread_events):
+def select_camera(stdscr, camera_indices, switcher, capture_ref, terminate_event, quiesce):
     """
     Select a camera from the available indices.
     """
@@ -318,44 +506,37 @@ def select_camera(stdscr, capture_ref, displays, frame_buffer, camera_indices, t
         key = stdscr.getch()
 
         if key == ord('\n'):
-            thread_events[1].set()  # Pause the threads
-            while not thread_events[2].is_set() and not thread_events[3].is_set():
-                time.sleep(0.001)
-
             camera_index = camera_indices[current_index]
-            if capture_ref[0] and capture_ref[0].isOpened():
-                capture_ref[0].release()
+            stdscr.addstr(len(camera_indices) + 4, 0, f"Opening camera {camera_index}...")
+            stdscr.refresh()
 
-            new_capture = cv2.VideoCapture(camera_index)
-            capture_ref[0] = new_capture  # Update the capture reference
-            if not new_capture.isOpened():
-                stdscr.addstr(len(camera_indices) + 4, 0, f"Unable to open camera with index: {camera_index}")
+            # the current camera keeps feeding the displays until the new one is live
+            switch = switcher.request(camera_index)
+            released = ''
+            if not switcher.wait(switch, terminate_event) and switch.busy and capture_ref[0].isOpened():
+                # the device may be busy because of the camera currently open, retry with it released
+                if switcher.release_current(capture_ref, quiesce):
+                    released = (f" The previous camera was released first, the threads took {quiesce.quiesce_time * 1000:.1f} ms "
+                                f"to pause and stalled {quiesce.stall_time * 1000:.1f} ms.")
+                    switch = switcher.request(camera_index)
+                    switcher.wait(switch, terminate_event)
+                else:
+                    switch.error += "; the current camera could not be released to retry"
+            stdscr.move(len(camera_indices) + 4, 0)
+            stdscr.clrtoeol()
+            if switch.error:
+                stdscr.addstr(len(camera_indices) + 4, 0, f"{switch.error}. Press any key to continue.")
                 stdscr.refresh()
                 stdscr.getch()
-                thread_events[1].clear()  # Resume the threads
                 continue
 
             stdscr.attron(curses.color_pair(4))
-            stdscr.addstr(len(camera_indices) + 4, 0, f"Camera {camera_index} selected. Press any key to continue.")
+            stdscr.addstr(len(camera_indices) + 4, 0, f"Camera {camera_index} selected, live after "
+                          f"{switch.switch_time * 1000:.1f} ms.{released} Press any key to continue.")
             stdscr.attroff(curses.color_pair(4))
             stdscr.refresh()
             stdscr.getch()
 
-            frame_interval = 1.0 / new_capture.get(cv2.CAP_PROP_FPS)
-            ret, frame = new_capture.read()
-            if not ret:
-                stdscr.addstr(len(camera_indices) + 6, 0, 'Error: Unable to read initial frame. Press any key to continue.')
-                stdscr.refresh()
-                stdscr.getch()
-                thread_events[1].clear()  # Resume the threads
-                continue
-
-            frame_buffer.add_to_tail(frame, time.perf_counter())
-            for display in displays:
-                display.frame_node = frame_buffer.head_node
-
-            thread_events[1].clear()  # Resume the threads
-
             break
         elif key == ord('\t'):
             current_index = (current_index + 1) % len(camera_indices)
@@ -367,7 +548,7 @@ def select_camera(stdscr, capture_ref, displays, frame_buffer, camera_indices, t
     curses.noecho()
     curses.curs_set(1)
 
-def modify_display(stdscr, display, terminate_event):
+def modify_display(stdscr, displays, display, terminate_event, quiesce):
     """
     Modify the settings of an existing display.
     """
@@ -424,8 +605,8 @@ def modify_display(stdscr, display, terminate_event):
             elif options[current_option] == "Frame Rate":
                 edit_frame_rate(stdscr, display)
             elif options[current_option] == "Remove Display":
-                remove_display(stdscr, displays, display)
-                break
+                if remove_display(stdscr, displays, display, quiesce):
+                    break
         elif key == 27:  # ESC key
             break
 
@@ -481,16 +662,25 @@ def edit_frame_rate(stdscr, display):
     curses.noecho()
     curses.curs_set(0)
 
-def remove_display(stdscr, displays, display):
+def remove_display(stdscr, displays, display, quiesce):
     """
     Remove a display from the list.
     """
+    # the display thread iterates over displays, so only change the list while it is parked
+    if not quiesce.pause():
+        stdscr.attron(curses.color_pair(2))
+        stdscr.addstr(10, 0, "The capture and display threads did not pause, the display was not removed. Press any key to continue.")
+        stdscr.attroff(curses.color_pair(2))
+        stdscr.getch()
+        return False
     displays.remove(display)
+    quiesce.resume()
     cv2.destroyWindow(f'Display {display.delay}s delay')
+    return True
     
-def run_menu(stdscr, displays, terminate_event, capture, frame_buffer, camera_indecies):
+def run_menu(stdscr, displays, terminate_event, capture, frame_buffer, camera_indecies, quiesce, switcher):
     try:
-        menu(stdscr, displays, terminate_event, capture, frame_buffer, camera_indecies)
+        menu(stdscr, displays, terminate_event, capture, frame_buffer, camera_indecies, quiesce, switcher)
     finally:
         curses.endwin()
 
@@ -504,25 +694,24 @@ if __name__ == "__main__":
     frame_interval = 1.0 / 1000
 
     terminate_event = threading.Event()
-    pause = threading.Event()
-    pause_capture_ack = threading.Event()
-    pause_display_ack = threading.Event()
-
-    thread_events = [terminate_event, pause, pause_capture_ack, pause_display_ack]
+    thread_events = [terminate_event]
+    quiesce = QuiesceBarrier(parties=2)  # capture and display threads
+    switcher = CameraSwitcher()
 
     # Start the menu in its own thread
-    menu_thread = threading.Thread(target=curses.wrapper, args=(run_menu, displays, thread_events, capture_ref, frame_buffer, camera_indecies))
+    menu_thread = threading.Thread(target=curses.wrapper, args=(run_menu, displays, thread_events, capture_ref, frame_buffer, camera_indecies, quiesce, switcher))
     menu_thread.start()
 
     # Start the capture and display frames in their own threads
-    capture_thread = threading.Thread(target=capture_frames, args=(capture_ref, frame_buffer, frame_interval, thread_events))
+    capture_thread = threading.Thread(target=capture_frames, args=(capture_ref, frame_buffer, frame_interval, thread_events, quiesce, switcher))
     capture_thread.start()
     
-    display_frames(frame_buffer, displays, thread_events)
+    display_frames(frame_buffer, displays, thread_events, quiesce)
 
     # Join the threads and call terminate function
     menu_thread.join()
     capture_thread.join()
-    terminate(capture, terminate_event)
+    print(f"\033[93mCapture and display thread pauses: {quiesce.summary()}\033[0m")
+    terminate(capture_ref[0], terminate_event)
 
 
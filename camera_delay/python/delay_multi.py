@@ -4,6 +4,10 @@ import time
 import multiprocessing as mp
 import functools
 
+from delay_config import load_config
+from camera_discovery import first_camera_index
+from realtime import thread_policy, policy_target
+
 class Node:
     def __init__(self, value, time_stamp=0, next_node=None, prev_node=None):
         self.value = value
@@ -62,14 +66,10 @@ def terminate(capture):
     exit()
 
 def get_webcam_index():
-    for camera_index in range(10):
-        cap = cv2.VideoCapture(camera_index)
-        if cap.isOpened():
-            print(f'\033[92mCamera index available: {camera_index}\033[0m')
-            cap.release()
-            return camera_index
-    print("\033[91mCamera not detected, terminating\033[0m")
-    terminate(None)
+    camera_index = first_camera_index()
+    if camera_index is None:
+        exit()
+    return camera_index
 
 def retrieve_frames(capture, run, read, lock, frame_ref):
     while run.is_set():
@@ -187,50 +187,62 @@ def compare_display(a, b):
 
 key_function = functools.cmp_to_key(compare_display)
 
+# the delay_config settings this engine honours, load_config rejects the others
+CONFIG_OPTIONS = ('cameras', 'width', 'height', 'displays', 'capture_interval', 'update_interval', 'affinity', 'fifo_priority', 'nice')
+
 if __name__ == "__main__":
+    config = load_config("Delay a camera feed on one or more displays using processes.", supported=CONFIG_OPTIONS, single_camera=True)
     print("\033[2J\033[H")  # Clear screen
-    capture = cv2.VideoCapture(get_webcam_index())
+    capture = cv2.VideoCapture(config.camera if config.camera is not None else get_webcam_index())
+    if config.width and config.height:
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, config.width)
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, config.height)
     max_camera_fps = capture.get(cv2.CAP_PROP_FPS)
     print(f"\033[93mMax camera FPS: {max_camera_fps}\033[0m")
 
-    # Interactive CLI interface with error handling
-    while True:
-        try:
-            num_displays = int(input("\033[94mEnter the number of displays: \033[0m"))
-            if num_displays <= 0:
-                raise ValueError("The number of displays must be a positive integer.")
-            break
-        except ValueError as e:
-            print(f"\033[91mInvalid input: {e}. Please try again.\033[0m")
-
     displays = []
-    
-    for i in range(num_displays):
+    if config.displays:
+        for display in config.displays:
+            if display.frame_rate > max_camera_fps:
+                print(f"\033[93mFrame rate {display.frame_rate} of the {display.delay}s display capped at {max_camera_fps} fps\033[0m")
+            displays.append(CaptureDisplay(display.delay, min(display.frame_rate, max_camera_fps)))
+    else:
+        # Interactive CLI interface with error handling
         while True:
             try:
-                delay = float(input(f"\033[94mEnter the delay for display {i+1} (in seconds): \033[0m"))
-                if delay < 0:
-                    raise ValueError("Delay must be a non-negative value.")
+                num_displays = int(input("\033[94mEnter the number of displays: \033[0m"))
+                if num_displays <= 0:
+                    raise ValueError("The number of displays must be a positive integer.")
                 break
             except ValueError as e:
                 print(f"\033[91mInvalid input: {e}. Please try again.\033[0m")
+
+        for i in range(num_displays):
+            while True:
+                try:
+                    delay = float(input(f"\033[94mEnter the delay for display {i+1} (in seconds): \033[0m"))
+                    if delay < 0:
+                        raise ValueError("Delay must be a non-negative value.")
+                    break
+                except ValueError as e:
+                    print(f"\033[91mInvalid input: {e}. Please try again.\033[0m")
         
-        while True:
-            try:
-                frame_rate = float(input(f"\033[94mEnter the frame rate for display {i+1} (in fps, max {max_camera_fps}): \033[0m"))
-                if frame_rate <= 0 or frame_rate > max_camera_fps:
-                    raise ValueError(f"Frame rate must be a positive value and not exceed {max_camera_fps} fps.")
-                frame_rate = min(frame_rate, max_camera_fps)  # Cap the frame rate at the camera's frame rate
-                break
-            except ValueError as e:
-                print(f"\033[91mInvalid input: {e}. Please try again.\033[0m")
+            while True:
+                try:
+                    frame_rate = float(input(f"\033[94mEnter the frame rate for display {i+1} (in fps, max {max_camera_fps}): \033[0m"))
+                    if frame_rate <= 0 or frame_rate > max_camera_fps:
+                        raise ValueError(f"Frame rate must be a positive value and not exceed {max_camera_fps} fps.")
+                    frame_rate = min(frame_rate, max_camera_fps)  # Cap the frame rate at the camera's frame rate
+                    break
+                except ValueError as e:
+                    print(f"\033[91mInvalid input: {e}. Please try again.\033[0m")
         
-        displays.append(CaptureDisplay(delay, frame_rate))
+            displays.append(CaptureDisplay(delay, frame_rate))
     
     displays.sort(key=key_function)
     print(displays)
 
-    frame_interval = 1.0 / 1000  # Interval for capturing frames
+    frame_interval = config.capture_interval  # Interval for capturing frames
 
     frame_buffer = DoublyLinkedList()
     ret, frame = capture.read()
@@ -243,6 +255,9 @@ if __name__ == "__main__":
 
     for display in displays:
         display.frame_node = frame_buffer.head_node
+        cv2.namedWindow(f'Display {display.delay}s delay', cv2.WINDOW_AUTOSIZE)
+        cv2.imshow(f'Display {display.delay}s delay', frame)
+    cv2.waitKey(1)
     
     run = mp.Event()
     read = mp.Event()
@@ -250,11 +265,12 @@ if __name__ == "__main__":
     read.clear()
     run.set()
     
-    capture_process = mp.Process(target=capture_frames, args=(capture, frame_buffer, frame_interval, read, run, lock, frame_ref))
-    update_process = mp.Process(target=update_displays, args=(frame_buffer, displays, run, frame_interval))
-    retrieve_process = mp.Process(target=retrieve_frames, args=(capture, run, read, lock, frame_ref))
-    cleanup_process = mp.Process(target=cleanup, args=(frame_buffer, displays, run))
-    record_process = mp.Process(target=record_values, args=(frame_buffer, displays, run))
+    policy = thread_policy(config)
+    capture_process = mp.Process(target=policy_target(policy, 'capture', capture_frames), args=(capture, frame_buffer, frame_interval, read, run, lock, frame_ref))
+    update_process = mp.Process(target=policy_target(policy, 'update', update_displays), args=(frame_buffer, displays, run, config.update_interval))
+    retrieve_process = mp.Process(target=policy_target(policy, 'retrieve', retrieve_frames), args=(capture, run, read, lock, frame_ref))
+    cleanup_process = mp.Process(target=policy_target(policy, 'cleanup', cleanup), args=(frame_buffer, displays, run))
+    record_process = mp.Process(target=policy_target(policy, 'record', record_values), args=(frame_buffer, displays, run))
 
     capture_process.start()
     update_process.start()
@@ -262,6 +278,8 @@ if __name__ == "__main__":
     cleanup_process.start()
     record_process.start()
 
+    if policy is not None:
+        policy.apply('display')
     display_frames(frame_buffer, displays, run)
 
     capture_process.join()
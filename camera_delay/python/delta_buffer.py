@@ -0,0 +1,132 @@
+import numpy as np
+import cv2
+import zlib
+
+from capture_format import LazyFrame, decode_frame
+from frame_retention import pixel_view
+
+# Keyframe + delta frame buffer
+# The 'delta' buffer backend is the linked list with every captured frame stored compressed:
+# every KEYFRAME_INTERVAL-th frame as a keyframe, the frames in between as the difference from
+# the frame before them. Differences of at most DELTA_THRESHOLD pixel levels (sensor noise) are
+# dropped, against the reconstructed frame rather than the captured one, so the error never builds
+# up along a group. Each display has a FrameDecoder holding the last frame it reconstructed; its
+# cursor only moves forward, one captured frame at a time at most, so presenting a frame costs one
+# delta. A group of frames is freed with the last of its frames. Compressed MJPG frames are kept
+# as they are.
+
+KEYFRAME_INTERVAL = 30  # frames per group, one keyframe and the deltas after it
+DELTA_THRESHOLD = 2     # pixel level differences up to this are treated as noise and not stored
+COMPRESSION_LEVEL = 1   # zlib level, higher levels cost much more time for little gain on deltas
+
+class FrameGroup:
+    """
+    A compressed keyframe and the compressed deltas of the frames after it, as pixel differences modulo 256.
+    """
+    __slots__ = ('key', 'deltas', 'shape')
+
+    def __init__(self, key, shape):
+        self.key = key
+        self.deltas = []
+        self.shape = shape
+
+    def keyframe(self):
+        return np.frombuffer(zlib.decompress(self.key), np.uint8).reshape(self.shape)
+
+    def apply(self, pixels, index):
+        """
+        Get the pixels of frame index of the group from those of the frame before it.
+        """
+        delta = np.frombuffer(zlib.decompress(self.deltas[index - 1]), np.uint8).reshape(self.shape)
+        # uint8 arithmetic wraps, so adding the difference modulo 256 restores the frame exactly
+        return pixels + delta
+
+    def nbytes(self):
+        return len(self.key) + sum(len(delta) for delta in self.deltas)
+
+class EncodedFrame(LazyFrame):
+    """
+    A frame stored as its index in a FrameGroup, 0 for the keyframe. bgr() reconstructs it from
+    the keyframe, displays present it through their FrameDecoder instead.
+    """
+    __slots__ = ('group', 'index')
+
+    def __init__(self, group, index, frame):
+        super().__init__(None, frame.pixel_format, frame.size)
+        self.group = group
+        self.index = index
+        self.sequence = frame.sequence
+        self.time_stamp = frame.time_stamp
+        self.capture_sequence = frame.capture_sequence
+
+    def bgr(self):
+        return FrameDecoder().bgr(self)
+
+class DeltaEncoder:
+    def __init__(self, interval=KEYFRAME_INTERVAL, threshold=DELTA_THRESHOLD, level=COMPRESSION_LEVEL, telemetry=None):
+        self.interval = interval
+        self.threshold = threshold
+        self.level = level
+        self.telemetry = telemetry
+        self.group = None
+        self.reference = None   # reconstruction of the last frame encoded, what the next delta is taken from
+
+    def encode(self, frame):
+        """
+        Get the EncodedFrame to buffer for a newly captured frame.
+        """
+        if frame.raw is None or frame.pixel_format == 'MJPG':
+            return frame
+        pixels = pixel_view(frame)
+        if self.group is None or len(self.group.deltas) + 1 >= self.interval or pixels.shape != self.group.shape:
+            data = zlib.compress(pixels, self.level)
+            self.group = FrameGroup(data, pixels.shape)
+            self.reference = pixels
+            kind = 'keyframes'
+        else:
+            delta = np.subtract(pixels, self.reference)
+            if self.threshold:
+                # the true difference, the wrapped one makes 0 and 255 look close
+                delta[cv2.absdiff(pixels, self.reference) <= self.threshold] = 0
+            self.reference = self.reference + delta
+            data = zlib.compress(delta, self.level)
+            self.group.deltas.append(data)
+            kind = 'deltas'
+        if self.telemetry is not None:
+            self.telemetry.count(f'Delta buffer {kind}')
+            self.telemetry.count('Delta buffer stored bytes', len(data))
+            self.telemetry.count('Delta buffer captured bytes', pixels.nbytes)
+        return EncodedFrame(self.group, len(self.group.deltas), frame)
+
+class FrameDecoder:
+    """
+    The last frame one display reconstructed, which the next one is reconstructed from.
+    """
+    def __init__(self, telemetry=None):
+        self.telemetry = telemetry
+        self.group = None
+        self.index = 0
+        self.pixels = None
+
+    def bgr(self, frame):
+        """
+        Get a buffered frame as a BGR image.
+        """
+        if not isinstance(frame, EncodedFrame):
+            return frame.bgr()
+        return decode_frame(self.reconstruct(frame), frame.pixel_format, frame.size)
+
+    def reconstruct(self, frame):
+        if frame.group is not self.group or frame.index < self.index:
+            # a new group, or a cursor that moved back: start again from the keyframe
+            self.group = frame.group
+            self.index = 0
+            self.pixels = frame.group.keyframe()
+            if self.telemetry is not None:
+                self.telemetry.count('Delta buffer keyframes decoded')
+        while self.index < frame.index:
+            self.index += 1
+            self.pixels = self.group.apply(self.pixels, self.index)
+            if self.telemetry is not None:
+                self.telemetry.count('Delta buffer deltas decoded')
+        return self.pixels
@@ -0,0 +1,79 @@
+import numpy as np
+import cv2
+
+from frame_array import FrameArray
+from delta_buffer import FrameDecoder
+
+# Temporal frame blending
+# Picking the buffered frame nearest to now - delay leaves the delay up to half a camera frame
+# period off target. Blending the two captured frames either side of the target time, weighted
+# by where the target falls between their arrival times, gives delays that do not depend on the
+# camera frame rate. Each display blends into its own preallocated output image. With the delta
+# buffer the earlier frame is decoded by the display's decoder and the later one by a second
+# decoder per display, so both only ever move forward.
+
+def bracket_nodes(node, target):
+    """
+    Find the frames either side of a target time in the linked list buffer, starting from a
+    display's cursor node. Returns (before, before_time, after, after_time) like FrameArray.bracket.
+    """
+    while node.time_stamp > target and node.prev_node is not None:
+        node = node.prev_node
+    while node.next_node is not None and node.next_node.time_stamp <= target:
+        node = node.next_node
+    # the capture loop adds the last frame again until a new one arrives, so a frame spans a run of nodes
+    first = node
+    while first.prev_node is not None and first.prev_node.value is node.value:
+        first = first.prev_node
+    after = node.next_node
+    while after is not None and after.value is node.value:
+        after = after.next_node
+    if after is None:
+        return node.value, first.time_stamp, None, None
+    return node.value, first.time_stamp, after.value, after.time_stamp
+
+class FrameBlender:
+    """
+    Presents each display as a blend of the frames either side of now - delay.
+    """
+    def __init__(self):
+        self.outputs = {}   # display -> preallocated blend output
+        self.shown = {}     # display -> (before, after, weight) last presented
+        self.decoders = {}  # display -> decoder of the later frame, with the delta buffer
+
+    def frame(self, frame_buffer, display, now, telemetry=None):
+        """
+        Get the image to present on a display at now, None if its window already shows it.
+        """
+        # the delay correction applies to what is shown, like advance_display
+        target = now - (display.delay_ns - display.correction_ns)
+        if isinstance(frame_buffer, FrameArray):
+            before, before_time, after, after_time = frame_buffer.bracket(target)
+        else:
+            before, before_time, after, after_time = bracket_nodes(display.frame_node, target)
+        weight = 0.0 if after is None else min(max((target - before_time) / (after_time - before_time), 0.0), 1.0)
+        if weight == 1.0:
+            before, weight = after, 0.0
+        shown = (before.sequence, after.sequence if weight else None, weight)
+        if shown == self.shown.get(display):
+            if telemetry is not None:
+                telemetry.count(f'Display {display.delay}s skipped')
+            return None
+        self.shown[display] = shown
+        if telemetry is not None:
+            telemetry.count(f'Display {display.delay}s presented')
+        if not weight:
+            return before.bgr() if display.decoder is None else display.decoder.bgr(before)
+
+        if telemetry is not None:
+            telemetry.count(f'Display {display.delay}s blended')
+        if display.decoder is None:
+            first, second = before.bgr(), after.bgr()
+        else:
+            after_decoder = self.decoders.setdefault(display, FrameDecoder(display.decoder.telemetry))
+            first, second = display.decoder.bgr(before), after_decoder.bgr(after)
+        output = self.outputs.get(display)
+        if output is None or output.shape != first.shape:
+            output = self.outputs[display] = np.empty_like(first)
+        cv2.addWeighted(first, 1.0 - weight, second, weight, 0.0, dst=output)
+        return output
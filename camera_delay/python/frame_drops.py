@@ -0,0 +1,91 @@
+import numpy as np
+import cv2
+import os
+from collections import deque
+
+# Capture frame drop detection
+# The capture loop adds the last frame again until a new one arrives, so a camera that drops
+# frames or a read() that stalls leaves no trace in the buffer. DropMonitor numbers the frames
+# of a capture source the way the camera produced them, gaps included, and counts the gaps:
+#   the driver frame counter (CAP_PROP_POS_FRAMES) when it advances with every frame,
+#   otherwise the time between frames, from the driver time stamps (CAP_PROP_POS_MSEC) when
+#   they advance, else the estimated capture or arrival times, against the frame period.
+# The frame period is the median of the recent frame intervals, so a camera delivering
+# fewer frames per second than CAP_PROP_FPS claims isn't counted as dropping every other frame.
+
+INTERVAL_WINDOW = 61     # frame intervals the frame period is the median of
+STALL_PERIODS = 4        # a read() taking this many frame periods counts as a stall
+DROP_EVENTS = 1000       # recent drops kept for correlating with display stutter
+
+class DropMonitor:
+    def __init__(self, source, frame_period_ns, telemetry=None):
+        self.source = source
+        self.frame_period = frame_period_ns
+        self.telemetry = telemetry
+        self.intervals = deque(maxlen=INTERVAL_WINDOW)
+        self.sequence = -1
+        self.last_time = None
+        self.last_arrival = None
+        self.last_driver_frame = None
+        self.last_driver_ms = None
+        self.dropped = 0
+        self.stalls = 0
+        self.events = deque(maxlen=DROP_EVENTS)  # (arrival, sequence, frames missed before it)
+
+    @classmethod
+    def for_capture(cls, source, capture, telemetry=None):
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        return cls(source, round(1e9 / fps) if fps > 0 else round(1e9 / 30), telemetry)
+
+    def frame(self, arrival, time_stamp=None, driver_frame=0, driver_ms=0):
+        """
+        Account for a frame read at arrival (ns), with its estimated capture time if there is one
+        and the driver frame counter and time stamp the capture reported for it.
+        Returns the frame's sequence number, which skips the frames missed before it.
+        """
+        missed = 0
+        counted = driver_frame > 0 and self.last_driver_frame is not None and driver_frame > self.last_driver_frame
+        if counted:
+            missed = int(driver_frame - self.last_driver_frame) - 1
+        frame_time = time_stamp if time_stamp is not None else arrival
+        if self.last_time is not None:
+            if driver_ms > 0 and self.last_driver_ms is not None and driver_ms > self.last_driver_ms:
+                interval = round((driver_ms - self.last_driver_ms) * 1e6)
+            else:
+                interval = frame_time - self.last_time
+            # the median isn't moved by occasional drops, but does follow a camera running slower than it claims
+            self.intervals.append(interval)
+            if len(self.intervals) >= 10:
+                self.frame_period = max(float(np.median(self.intervals)), 1.0)
+                # timing gaps only count once the frame period is known
+                if not counted:
+                    missed = max(round(interval / self.frame_period) - 1, 0)
+        stalled = self.last_arrival is not None and arrival - self.last_arrival > STALL_PERIODS * self.frame_period
+
+        self.sequence += 1 + missed
+        self.last_time = frame_time
+        self.last_arrival = arrival
+        self.last_driver_frame = driver_frame if driver_frame > 0 else None
+        self.last_driver_ms = driver_ms if driver_ms > 0 else None
+        if missed:
+            self.dropped += missed
+            self.events.append((arrival, self.sequence, missed))
+        if stalled:
+            self.stalls += 1
+        if self.telemetry is not None:
+            self.telemetry.count(f'Capture {self.source} frames')
+            if missed:
+                self.telemetry.count(f'Capture {self.source} dropped', missed)
+            if stalled:
+                self.telemetry.count(f'Capture {self.source} stalls')
+        return self.sequence
+
+    def write(self, directory="."):
+        """
+        Write the recent drops, one 'arrival time (ns); sequence; frames missed' line each,
+        to compare with the delay data written next to it.
+        """
+        with open(os.path.join(directory, f"{self.source}_frame_drops.txt"), 'w') as drops_file:
+            drops_file.write(f"Frames: {self.sequence + 1}; Dropped: {self.dropped}; Stalls: {self.stalls}\n")
+            for arrival, sequence, missed in self.events:
+                drops_file.write(f"{arrival}; {sequence}; {missed}\n")
@@ -0,0 +1,136 @@
+import numpy as np
+import cv2
+
+from capture_format import LazyFrame, decode_frame
+
+# Motion-adaptive frame retention
+# Every captured frame is kept at full size for as long as the longest delay, even when the
+# scene hardly changes. MotionRetention compares each new frame with the last frame kept in
+# full, on a grid of block averages (one cv2.resize), and keeps
+#   a reference to that frame when no block changed: no new pixels are stored,
+#   a DeltaFrame of only the changed blocks when few of them changed,
+#   the whole frame otherwise, which then becomes the frame later ones are compared with.
+# Every frame still gets its own buffer nodes and capture time, so presentation timing is
+# unchanged; only what is stored for near-identical frames shrinks. Compressed MJPG frames are
+# kept as they are, they would have to be decoded to be compared.
+
+RETENTION_BLOCK = 16        # block size in pixels
+RETENTION_THRESHOLD = 4     # block average change (in pixel levels) that counts as motion
+SPARSE_LIMIT = 0.25         # changed block fraction above which the whole frame is kept
+
+class DeltaFrame(LazyFrame):
+    """
+    A frame stored as the blocks that changed from a base frame, as (y, x, patch) in raw pixels.
+    It is rebuilt every time it is presented rather than cached, which would store it in full.
+    """
+    __slots__ = ('base', 'patches')
+
+    def __init__(self, base, patches):
+        super().__init__(None, base.pixel_format, base.size)
+        self.base = base
+        self.patches = patches
+
+    def bgr(self):
+        raw = pixel_view(self.base).copy()
+        for y, x, patch in self.patches:
+            raw[y:y + patch.shape[0], x:x + patch.shape[1]] = patch
+        return decode_frame(raw, self.pixel_format, self.size)
+
+    def nbytes(self):
+        return sum(patch.nbytes for y, x, patch in self.patches)
+
+def pixel_view(frame):
+    """
+    Get a frame's raw pixels as a (height, width, channels) array, None if they are compressed.
+    """
+    if frame.pixel_format == 'MJPG':
+        return None
+    if frame.pixel_format == 'YUYV':
+        width, height = frame.size
+        return frame.raw.reshape(height, width, 2)
+    return frame.raw
+
+def reference_frame(base):
+    """
+    A new frame showing the same pixels as base. It shares base's sequence id, so displays
+    already showing base skip it, but gets its own capture time and sequence number.
+    """
+    frame = LazyFrame(base.raw, base.pixel_format, base.size)
+    frame.sequence = base.sequence
+    return frame
+
+class MotionRetention:
+    def __init__(self, threshold=RETENTION_THRESHOLD, block=RETENTION_BLOCK, sparse_limit=SPARSE_LIMIT, telemetry=None):
+        self.threshold = threshold
+        self.block = block
+        self.sparse_limit = sparse_limit
+        self.telemetry = telemetry
+        self.base = None        # last frame kept in full
+        self.base_blocks = None
+        self.stored_bytes = 0   # pixel bytes kept for the frames retained so far
+        self.full_bytes = 0     # and what keeping every frame in full would have taken
+
+    def blocks(self, pixels):
+        height, width = pixels.shape[:2]
+        grid = (-(-width // self.block), -(-height // self.block))
+        blocks = cv2.resize(pixels, grid, interpolation=cv2.INTER_AREA)
+        return blocks.reshape(grid[1], grid[0], -1).astype(np.int16)
+
+    def retain(self, frame):
+        """
+        Get what to store for a newly captured frame: a reference, a DeltaFrame or the frame itself.
+        """
+        pixels = pixel_view(frame)
+        if pixels is None:
+            return frame
+        blocks = self.blocks(pixels)
+        self.full_bytes += pixels.nbytes
+        if self.telemetry is not None:
+            self.telemetry.count('Retention captured bytes', pixels.nbytes)
+        if self.base is None or blocks.shape != self.base_blocks.shape:
+            return self.keep(frame, blocks, pixels.nbytes)
+
+        changed = np.abs(blocks - self.base_blocks).max(axis=2) > self.threshold
+        count = int(np.count_nonzero(changed))
+        if count == 0:
+            retained = reference_frame(self.base)
+            self.record('reference', 0)
+        elif count <= self.sparse_limit * changed.size:
+            retained = DeltaFrame(self.base, self.patches(pixels, changed))
+            self.record('delta', retained.nbytes())
+        else:
+            return self.keep(frame, blocks, pixels.nbytes)
+        retained.time_stamp = frame.time_stamp
+        retained.capture_sequence = frame.capture_sequence
+        return retained
+
+    def patches(self, pixels, changed):
+        # one patch per run of changed blocks in a block row
+        patches = []
+        for row in np.flatnonzero(changed.any(axis=1)):
+            columns = np.flatnonzero(changed[row])
+            runs = np.split(columns, np.flatnonzero(np.diff(columns) > 1) + 1)
+            y = row * self.block
+            for run in runs:
+                x = run[0] * self.block
+                patch = pixels[y:y + self.block, x:(run[-1] + 1) * self.block]
+                patches.append((y, x, np.ascontiguousarray(patch)))
+        return patches
+
+    def keep(self, frame, blocks, nbytes):
+        self.base = frame
+        self.base_blocks = blocks
+        self.record('full', nbytes)
+        return frame
+
+    def record(self, kind, nbytes):
+        self.stored_bytes += nbytes
+        if self.telemetry is not None:
+            self.telemetry.count(f'Retention {kind} frames')
+            self.telemetry.count('Retention stored bytes', nbytes)
+
+    def stored_fraction(self):
+        """
+        Get the fraction of the full frame size stored so far.
+        """
+        return self.stored_bytes / self.full_bytes if self.full_bytes else 1.0
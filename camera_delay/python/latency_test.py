@@ -0,0 +1,145 @@
+import cv2
+import time
+import threading
+
+from delay_data import write_delay_data, delay_stats
+from camera_discovery import first_camera_index
+
+# Glass-to-glass latency measurement
+# A window shows an ArUco marker whose id is a frame counter. Point the camera at that window:
+# the latency of a reading is the time between the marker being presented and the camera frame
+# that first shows it returning from capture.read(), so it includes display scan-out, exposure
+# and the capture pipeline. Readings are written in the cpp/Delay_Cli/data format with a
+# target delay of 0 s, so the average is the fixed offset the engines should subtract.
+
+MARKER_DICTIONARY = cv2.aruco.DICT_6X6_250
+MARKER_COUNT = 250      # ids wrap around, so latency must stay below MARKER_COUNT * MARKER_PERIOD
+MARKER_SIZE = 400       # marker side in pixels
+MARKER_BORDER = 60      # white quiet zone around the marker in pixels
+MARKER_PERIOD = 0.1     # seconds each marker stays on screen
+NUM_DATA_POINTS = 1000
+TARGET_DELAY = 0.0
+WINDOW_NAME = 'Latency marker'
+
+class MarkerLog:
+    """
+    Keeps the presentation time of every marker id currently on screen and
+    turns the first detection of each presentation into a latency reading.
+    """
+    def __init__(self):
+        self.shown_times = {}
+        self.measured = set()
+        self.lock = threading.Lock()
+
+    def shown(self, marker_id, time_stamp):
+        """
+        Record the time a marker was presented.
+        """
+        with self.lock:
+            self.shown_times[marker_id] = time_stamp
+            self.measured.discard(marker_id)
+
+    def detected(self, marker_id, time_stamp):
+        """
+        Return the latency of a detected marker, or None if this presentation was already measured.
+        """
+        with self.lock:
+            if marker_id in self.measured or marker_id not in self.shown_times:
+                return None
+            self.measured.add(marker_id)
+            latency = time_stamp - self.shown_times[marker_id]
+        return latency if latency >= 0 else None
+
+def get_marker_detector():
+    """
+    Get a marker detection function using the same dictionary and parameters as aruco_test.py.
+    """
+    aruco_dict = cv2.aruco.getPredefinedDictionary(MARKER_DICTIONARY)
+    parameters = cv2.aruco.DetectorParameters()
+    if hasattr(cv2.aruco, 'ArucoDetector'):
+        return cv2.aruco.ArucoDetector(aruco_dict, parameters).detectMarkers
+    return lambda gray: cv2.aruco.detectMarkers(gray, aruco_dict, parameters=parameters)
+
+def render_markers():
+    """
+    Render every marker image up front so presenting one is a single imshow call.
+    """
+    aruco_dict = cv2.aruco.getPredefinedDictionary(MARKER_DICTIONARY)
+    markers = []
+    for marker_id in range(MARKER_COUNT):
+        marker = cv2.aruco.generateImageMarker(aruco_dict, marker_id, MARKER_SIZE)
+        markers.append(cv2.copyMakeBorder(marker, MARKER_BORDER, MARKER_BORDER, MARKER_BORDER, MARKER_BORDER,
+                                          cv2.BORDER_CONSTANT, value=255))
+    return markers
+
+def detect_markers(capture, marker_log, latencies, run):
+    """
+    Read camera frames, detect markers and collect one latency reading per presented marker.
+    """
+    detect = get_marker_detector()
+    while run.is_set() and len(latencies) < NUM_DATA_POINTS:
+        ret, frame = capture.read()
+        arrival_time = time.perf_counter()
+        if not ret:
+            print('\033[91mError: Unable to read frame\033[0m')
+            break
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        corners, ids, rejected = detect(gray)
+        if ids is None:
+            continue
+        for marker_id in ids.flatten():
+            latency = marker_log.detected(int(marker_id), arrival_time)
+            if latency is not None:
+                latencies.append(latency)
+    run.clear()
+
+def present_markers(marker_log, run):
+    """
+    Show the frame counter markers, one every MARKER_PERIOD seconds.
+    """
+    markers = render_markers()
+    cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_NORMAL)
+    counter = 0
+    while run.is_set():
+        start_time = time.perf_counter()
+        marker_id = counter % MARKER_COUNT
+        # recorded before the window is updated, so the latency includes the rendering and the
+        # camera can't see the marker before its shown time is known
+        marker_log.shown(marker_id, time.perf_counter())
+        cv2.imshow(WINDOW_NAME, markers[marker_id])
+        cv2.waitKey(1)
+        counter += 1
+
+        while run.is_set() and time.perf_counter() - start_time < MARKER_PERIOD:
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                run.clear()
+
+if __name__ == "__main__":
+    camera_index = first_camera_index()
+    if camera_index is None:
+        exit()
+    capture = cv2.VideoCapture(camera_index)
+    print(f"\033[93mPoint the camera at the '{WINDOW_NAME}' window, press q to stop early\033[0m")
+
+    marker_log = MarkerLog()
+    latencies = []
+    run = threading.Event()
+    run.set()
+
+    detect_thread = threading.Thread(target=detect_markers, args=(capture, marker_log, latencies, run))
+    detect_thread.start()
+
+    present_markers(marker_log, run)
+
+    detect_thread.join()
+    capture.release()
+    cv2.destroyAllWindows()
+
+    if latencies:
+        write_delay_data([(TARGET_DELAY, latencies)])
+        stats = delay_stats(TARGET_DELAY, latencies)
+        print(f"\033[92mGlass-to-glass latency: average {stats['average']}, standard deviation: {stats['std_dev']}, "
+              f"high: {stats['high']}, low: {stats['low']}\033[0m")
+    else:
+        print("\033[91mNo markers detected, nothing written\033[0m")
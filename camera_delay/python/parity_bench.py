@@ -0,0 +1,205 @@
+import numpy as np
+import os
+import sys
+import time
+import signal
+import argparse
+import tempfile
+import subprocess
+
+from delay_config import parse_display, BUFFER_BACKENDS
+from delay_data import read_delay_data, format_value, NUM_DATA_POINTS
+
+# Cross-implementation parity benchmark
+# Runs each delay engine in its own process against the same input, the Python engines through
+# bench_delay.py (headless, synthetic camera or a recorded video) and optionally the C++ DelayCLI,
+# then reads back the delay data each one wrote (the cpp/Delay_Cli/data format) and reports the
+# delay error distribution, CPU time and peak RSS of all of them in one table.
+# The C++ DelayCLI only writes delay data when built with REC_STATS true, and it needs a camera
+# and a display (a v4l2loopback device playing the recording and Xvfb will do).
+# Not a full parity comparison: only the delay_cli.py and delay_async.py engines, with every buffer
+# backend, run headless. delay_multi.py, delay_func_cli.py and delay_full_cli.py are interactive
+# and have no headless entry point, and the C++ DelayCLI reads a live camera, so it only sees the
+# same input if that camera plays the same recording. The two sides also measure different
+# delays: the Python engines record the delay a frame was presented with at the display's last
+# refresh, the C++ collect_data now - time_stamp, which adds the time since that refresh (half a
+# refresh period on average). The Python CPU time and peak RSS include the synthetic camera or the
+# video decoding feeding them. The report states all of these.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CPP_BINARY = os.path.join(SCRIPT_DIR, '..', 'cpp', 'Delay_Cli', 'build', 'DelayCLI')
+PYTHON_ENGINES = tuple((engine, buffer) for engine in ('threaded', 'asyncio') for buffer in BUFFER_BACKENDS)
+NOT_COVERED = ("Not covered: delay_multi.py, delay_func_cli.py and delay_full_cli.py, which have no headless mode.",
+               "Python CPU time and peak RSS include the synthetic camera or --video decoding feeding the engine.",
+               "The C++ DelayCLI reads a live camera, not the synthetic camera or --video input of the Python engines.",
+               "Delay readings differ: Python records the delay at the display's last refresh, C++ now - time_stamp, "
+               "which adds the time since that refresh (half a refresh period on average).")
+
+def run_measured(command, cwd, stdin_text=None, timeout=None):
+    """
+    Run a command in cwd with its output going to cwd/output.log, and return its exit status
+    (None if it timed out and was killed), wall time, CPU time (user + system) and peak RSS in bytes.
+    """
+    with open(os.path.join(cwd, 'output.log'), 'w') as log:
+        start_time = time.perf_counter()
+        process = subprocess.Popen(command, cwd=cwd, stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT, text=True)
+        if stdin_text:
+            process.stdin.write(stdin_text)
+        process.stdin.close()
+        # reap the child with wait4 instead of Popen.wait, to get its own resource usage
+        timed_out = False
+        while True:
+            pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                break
+            if timeout is not None and time.perf_counter() - start_time > timeout:
+                process.send_signal(signal.SIGKILL)
+                pid, status, usage = os.wait4(process.pid, 0)
+                timed_out = True
+                break
+            time.sleep(0.1)
+        wall_time = time.perf_counter() - start_time
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    return {
+        'status': None if timed_out else process.returncode,
+        'wall': wall_time,
+        'cpu': usage.ru_utime + usage.ru_stime,
+        'rss': peak_rss,
+    }
+
+def error_stats(target_delay, values):
+    """
+    Summarize the delay error (reading - target) of one display, in seconds.
+    """
+    errors = np.asarray(values, dtype=np.float64) - target_delay
+    absolute = np.abs(errors)
+    return {
+        'target_delay': target_delay,
+        'readings': len(errors),
+        'bias': float(np.mean(errors)),
+        'std_dev': float(np.std(errors)),
+        'p50': float(np.percentile(absolute, 50)),
+        'p99': float(np.percentile(absolute, 99)),
+        'max': float(np.max(absolute)),
+    }
+
+def collect(name, directory, usage):
+    """
+    Read back the delay data an engine wrote and combine it with its resource use.
+    """
+    data_sets = [(target_delay, values) for target_delay, values in read_delay_data(directory) if len(values)]
+    if usage is None:
+        note = 'recorded data'
+    elif usage['status'] is None:
+        note = 'timed out'
+    elif usage['status'] != 0:
+        note = f"exit status {usage['status']}, see {os.path.join(directory, 'output.log')}"
+    elif not data_sets:
+        note = 'no delay data written'
+    else:
+        note = ''
+    return {
+        'engine': name,
+        'errors': [error_stats(target_delay, values) for target_delay, values in data_sets],
+        'usage': usage,
+        'note': note,
+    }
+
+def run_python_engine(engine, buffer, display_configs, args, directory):
+    command = [sys.executable, os.path.join(SCRIPT_DIR, 'bench_delay.py'), '--engine', engine, '--buffer', buffer,
+               '--duration', str(args.duration), '--data-points', str(args.data_points), '--data-dir', directory]
+    for display in display_configs:
+        command += ['--display', f'{display.delay}:{display.frame_rate}']
+    if args.video:
+        command += ['--video', args.video]
+    if args.fps:
+        command += ['--fps', str(args.fps)]
+    max_delay = max(display.delay for display in display_configs)
+    return run_measured(command, directory, timeout=max_delay + args.duration + args.timeout)
+
+def run_cpp_engine(binary, display_configs, args, directory):
+    # DelayCLI prompts for the video size, the number of displays, and a delay and frame rate per display
+    answers = [args.width, args.height, len(display_configs)]
+    for display in display_configs:
+        answers += [display.delay, display.frame_rate]
+    stdin_text = ''.join(f'{answer}\n' for answer in answers)
+    # it stops by itself once collect_data has its NUM_DATA_POINTS readings, at most 10 ms apart
+    max_delay = max(display.delay for display in display_configs)
+    timeout = max_delay + NUM_DATA_POINTS * 0.01 + args.timeout
+    return run_measured([os.path.abspath(binary)], directory, stdin_text, timeout)
+
+def report_lines(results):
+    lines = [f"{'engine':<22} {'target':>7} {'readings':>8} {'bias':>10} {'std dev':>10} {'p50 error':>10} "
+             f"{'p99 error':>10} {'max error':>10}"]
+    for result in results:
+        for stats in result['errors']:
+            lines.append(f"{result['engine']:<22} {format_value(stats['target_delay']):>7} {stats['readings']:>8} "
+                         f"{format_value(stats['bias']):>10} {format_value(stats['std_dev']):>10} "
+                         f"{format_value(stats['p50']):>10} {format_value(stats['p99']):>10} {format_value(stats['max']):>10}")
+    lines.append('')
+    lines.append(f"{'engine':<22} {'wall s':>8} {'CPU s':>8} {'CPU %':>7} {'peak RSS MB':>12}  note")
+    for result in results:
+        usage = result['usage']
+        if usage is None:
+            lines.append(f"{result['engine']:<22} {'-':>8} {'-':>8} {'-':>7} {'-':>12}  {result['note']}")
+            continue
+        lines.append(f"{result['engine']:<22} {usage['wall']:>8.1f} {usage['cpu']:>8.2f} "
+                     f"{usage['cpu'] / usage['wall'] * 100:>7.1f} {usage['rss'] / 2**20:>12.1f}  {result['note']}")
+    lines.append('')
+    lines += NOT_COVERED[:2]
+    if any(result['engine'].startswith('cpp') for result in results):
+        lines += NOT_COVERED[2:]
+    return lines
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Python and C++ delay engines against the same input and compare "
+                                                 "their delay error, CPU time and peak memory.")
+    parser.add_argument('--display', type=parse_display, action='append', dest='displays', metavar='DELAY:FPS')
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds of sampling per Python engine")
+    parser.add_argument('--data-points', dest='data_points', type=int, default=NUM_DATA_POINTS, help="readings per display")
+    parser.add_argument('--fps', type=float, help="synthetic camera frame rate (default: 30, or the video's own)")
+    parser.add_argument('--video', help="play this recording to the Python engines instead of the synthetic camera")
+    parser.add_argument('--engine', action='append', dest='engines', choices=[f'{engine}/{buffer}' for engine, buffer in PYTHON_ENGINES],
+                        help="Python engine to run, repeat for several (default: all)")
+    parser.add_argument('--cpp', action='store_true', help="also run the C++ DelayCLI (needs a camera and a REC_STATS build)")
+    parser.add_argument('--cpp-binary', dest='cpp_binary', default=CPP_BINARY)
+    parser.add_argument('--cpp-data', dest='cpp_data', help="include C++ delay data recorded earlier, e.g. ../cpp/Delay_Cli/data")
+    parser.add_argument('--width', type=int, default=640, help="capture width given to the C++ DelayCLI")
+    parser.add_argument('--height', type=int, default=480, help="capture height given to the C++ DelayCLI")
+    parser.add_argument('--timeout', type=float, default=60.0, help="seconds each engine may run past its expected end")
+    parser.add_argument('--output-dir', dest='output_dir', help="keep each engine's delay data and output here (default: a temporary directory)")
+    parser.add_argument('--report', help="also write the report to this file")
+    args = parser.parse_args()
+
+    display_configs = args.displays or [parse_display('0:30'), parse_display('0.5:30'), parse_display('1:30')]
+    output_dir = args.output_dir or tempfile.mkdtemp(prefix='parity_bench_')
+    results = []
+    for engine, buffer in PYTHON_ENGINES:
+        name = f'{engine}/{buffer}'
+        if args.engines and name not in args.engines:
+            continue
+        directory = os.path.join(output_dir, f'{engine}_{buffer}')
+        os.makedirs(directory, exist_ok=True)
+        print(f"\033[93mRunning {name}\033[0m")
+        results.append(collect(name, directory, run_python_engine(engine, buffer, display_configs, args, directory)))
+
+    if args.cpp:
+        directory = os.path.join(output_dir, 'cpp')
+        os.makedirs(directory, exist_ok=True)
+        if not os.access(args.cpp_binary, os.X_OK):
+            print(f"\033[91mC++ DelayCLI at {args.cpp_binary} is missing or not executable, build cpp/Delay_Cli first\033[0m")
+        else:
+            print(f"\033[93mRunning C++ DelayCLI\033[0m")
+            results.append(collect('cpp', directory, run_cpp_engine(args.cpp_binary, display_configs, args, directory)))
+    if args.cpp_data:
+        results.append(collect('cpp (recorded)', args.cpp_data, None))
+
+    lines = report_lines(results)
+    print('\n'.join(lines))
+    if args.report:
+        with open(args.report, 'w') as report_file:
+            report_file.write('\n'.join(lines) + '\n')
+        print(f"\033[92mReport written to {args.report}\033[0m")
+    print(f"\033[92mDelay data and engine output in {output_dir}\033[0m")
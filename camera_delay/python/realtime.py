@@ -0,0 +1,129 @@
+import os
+import threading
+import functools
+
+# Roles of the delay engine threads (or processes in delay_multi.py).
+# The timing-critical loops are the ones that get real-time scheduling.
+REALTIME_ROLES = ('retrieve', 'capture', 'update', 'display')
+THREAD_ROLES = REALTIME_ROLES + ('cleanup', 'record', 'control')
+
+SCHEDULER_NAMES = {
+    getattr(os, 'SCHED_OTHER', None): 'SCHED_OTHER',
+    getattr(os, 'SCHED_FIFO', None): 'SCHED_FIFO',
+    getattr(os, 'SCHED_RR', None): 'SCHED_RR',
+    getattr(os, 'SCHED_BATCH', None): 'SCHED_BATCH',
+    getattr(os, 'SCHED_IDLE', None): 'SCHED_IDLE',
+}
+
+def parse_cores(value):
+    """
+    Parse a core list like '2', '2,3' or '0-3'.
+    """
+    cores = set()
+    for part in value.split(','):
+        if '-' in part:
+            low, high = part.split('-')
+            cores.update(range(int(low), int(high) + 1))
+        else:
+            cores.add(int(part))
+    return sorted(cores)
+
+class ThreadPolicy:
+    """
+    CPU affinity and scheduling for the engine threads.
+    affinity maps a role to the cores its thread may run on, roles left out may run on any core.
+    fifo_priority (1-99) requests SCHED_FIFO for the real-time roles, and nice is used instead
+    when SCHED_FIFO is not given or not permitted. Anything refused is reported and skipped.
+    New threads inherit the policy of the thread that starts them, so apply it in the thread itself.
+    """
+    def __init__(self, affinity=None, fifo_priority=None, nice=None, verbose=True):
+        self.affinity = {role: list(cores) for role, cores in (affinity or {}).items()}
+        self.fifo_priority = fifo_priority
+        self.nice = nice
+        self.verbose = verbose
+        self.all_cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None
+        self.applied = {}
+
+    def apply(self, role):
+        """
+        Apply the policy for role to the calling thread and return a description of the policy in effect.
+        """
+        # on Linux affinity and scheduling are per thread, addressed by the native thread id
+        tid = threading.get_native_id()
+        refused = []
+
+        cores = self.affinity.get(role, self.all_cores)
+        if cores is not None and hasattr(os, 'sched_setaffinity'):
+            try:
+                os.sched_setaffinity(tid, cores)
+            except OSError as e:
+                refused.append(f"affinity {cores} ({e.strerror})")
+        elif role in self.affinity:
+            refused.append("affinity (not supported on this platform)")
+
+        fifo = False
+        if role in REALTIME_ROLES and self.fifo_priority is not None:
+            try:
+                os.sched_setscheduler(tid, os.SCHED_FIFO, os.sched_param(self.fifo_priority))
+                fifo = True
+            except (OSError, AttributeError) as e:
+                refused.append(f"SCHED_FIFO {self.fifo_priority} ({getattr(e, 'strerror', None) or 'not supported'})")
+        elif hasattr(os, 'sched_getscheduler') and os.sched_getscheduler(tid) != os.SCHED_OTHER:
+            # don't let a background thread keep the real-time policy of the thread that started it
+            os.sched_setscheduler(tid, os.SCHED_OTHER, os.sched_param(0))
+
+        if role in REALTIME_ROLES and not fifo and self.nice is not None:
+            try:
+                os.setpriority(os.PRIO_PROCESS, tid, self.nice)
+            except (OSError, AttributeError) as e:
+                refused.append(f"nice {self.nice} ({getattr(e, 'strerror', None) or 'not supported'})")
+
+        description = self.describe(tid)
+        if refused:
+            description += f", not permitted: {', '.join(refused)}"
+        self.applied[role] = description
+        if self.verbose:
+            print(f"\033[93m{role} thread: {description}\033[0m")
+        return description
+
+    def describe(self, tid=None):
+        """
+        Describe the affinity and scheduling policy in effect for a thread, by default the calling one.
+        """
+        tid = threading.get_native_id() if tid is None else tid
+        parts = []
+        if hasattr(os, 'sched_getaffinity'):
+            parts.append(f"cores {sorted(os.sched_getaffinity(tid))}")
+        if hasattr(os, 'sched_getscheduler'):
+            scheduler = os.sched_getscheduler(tid)
+            name = SCHEDULER_NAMES.get(scheduler, str(scheduler))
+            if scheduler in (os.SCHED_FIFO, os.SCHED_RR):
+                name += f" {os.sched_getparam(tid).sched_priority}"
+            parts.append(name)
+        if hasattr(os, 'getpriority'):
+            parts.append(f"nice {os.getpriority(os.PRIO_PROCESS, tid)}")
+        return ', '.join(parts) if parts else "platform default"
+
+    def run(self, role, target, *args):
+        self.apply(role)
+        return target(*args)
+
+    def wrap(self, role, target):
+        """
+        Wrap a thread or process target so it applies the policy for role before running.
+        """
+        return functools.partial(self.run, role, target)
+
+def thread_policy(config, verbose=True):
+    """
+    Build the thread policy of a run config, None if it leaves scheduling at the defaults.
+    """
+    if not config.affinity and config.fifo_priority is None and config.nice is None:
+        return None
+    return ThreadPolicy(config.affinity, config.fifo_priority, config.nice, verbose)
+
+def policy_target(policy, role, target):
+    """
+    Wrap a thread or process target with the policy for role, unchanged without a policy.
+    """
+    return policy.wrap(role, target) if policy is not None else target
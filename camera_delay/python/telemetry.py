@@ -0,0 +1,33 @@
+import threading
+from collections import Counter
+
+class Telemetry:
+    """
+    Named counters of an engine run, e.g. presentations per display, and gauges holding the
+    latest value of something, e.g. a display's delay correction.
+    Safe to update from any thread.
+    """
+    def __init__(self):
+        self.counters = Counter()
+        self.gauges = {}
+        self.lock = threading.Lock()
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def set(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def get(self, name):
+        with self.lock:
+            return self.gauges[name] if name in self.gauges else self.counters[name]
+
+    def snapshot(self):
+        with self.lock:
+            return {**self.counters, **self.gauges}
+
+    def print_report(self):
+        for name, value in sorted(self.snapshot().items()):
+            print(f"\033[93m{name}: {value:g}\033[0m")
@@ -0,0 +1,68 @@
+import numpy as np
+import cv2
+import os
+import hashlib
+
+CALIBRATION_FILE = 'calibration_data.npz'
+MAP_CACHE_DIR = 'undistort_maps'
+
+class Undistorter:
+    """
+    Applies precomputed undistortion maps to frames with cv2.remap.
+    The maps are fixed-point (CV_16SC2 + CV_16UC1), which is both the smallest
+    representation and the fastest one for remap.
+    """
+    def __init__(self, map1, map2):
+        self.map1 = map1
+        self.map2 = map2
+
+    def __call__(self, frame):
+        return cv2.remap(frame, self.map1, self.map2, cv2.INTER_LINEAR)
+
+def calibration_hash(calibration_file):
+    """
+    Hash the calibration file contents so cached maps are invalidated when it changes.
+    """
+    with open(calibration_file, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:16]
+
+def build_undistort_maps(camera_matrix, dist_coeffs, width, height, calibration_size=None):
+    """
+    Build fixed-point undistortion maps for a capture resolution.
+    The camera matrix is rescaled if the calibration images had a different resolution.
+    """
+    camera_matrix = np.array(camera_matrix, dtype=np.float64)
+    if calibration_size is not None and tuple(calibration_size) != (width, height):
+        camera_matrix[0] *= width / calibration_size[0]
+        camera_matrix[1] *= height / calibration_size[1]
+    new_camera_matrix, roi = cv2.getOptimalNewCameraMatrix(camera_matrix, dist_coeffs, (width, height), 0, (width, height))
+    return cv2.initUndistortRectifyMap(camera_matrix, dist_coeffs, None, new_camera_matrix, (width, height), cv2.CV_16SC2)
+
+def load_undistort_maps(width, height, calibration_file=CALIBRATION_FILE, cache_dir=MAP_CACHE_DIR):
+    """
+    Load the undistortion maps for a resolution from the disk cache, building and caching them on a miss.
+    Cache files are keyed by the calibration file hash and the resolution.
+    """
+    cache_file = os.path.join(cache_dir, f'{calibration_hash(calibration_file)}_{width}x{height}.npz')
+    if os.path.exists(cache_file):
+        with np.load(cache_file) as maps:
+            return maps['map1'], maps['map2']
+
+    with np.load(calibration_file) as calibration:
+        calibration_size = calibration['image_size'] if 'image_size' in calibration else None
+        map1, map2 = build_undistort_maps(calibration['camera_matrix'], calibration['dist_coeffs'], width, height, calibration_size)
+
+    # write to a temporary file first so an interrupted run never leaves a truncated cache entry
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_file = cache_file + '.tmp.npz'
+    np.savez(temp_file, map1=map1, map2=map2)
+    os.replace(temp_file, cache_file)
+    return map1, map2
+
+def get_undistorter(capture, calibration_file=CALIBRATION_FILE, cache_dir=MAP_CACHE_DIR):
+    """
+    Get an Undistorter for the current resolution of an opened capture.
+    """
+    width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    return Undistorter(*load_undistort_maps(width, height, calibration_file, cache_dir))